@@ -0,0 +1,121 @@
+"""
+Compares check_member with the previous settings lookups per activity
+against the in-memory integer app ID sets.
+
+    python -m benchmarks.bench_check_member
+"""
+
+import asyncio
+import os
+import tempfile
+import discord
+
+from time import perf_counter, time
+from types import SimpleNamespace
+
+import enums
+import utils
+
+from utils.init_database import load_macros_database, load_settings_database
+
+MEMBERS = 2_000
+KNOWN_APPS = 300
+ROUNDS = 20
+
+
+async def legacy_check_member(bot_utils: utils.BotUtils, member):
+    settings = bot_utils.settings
+    if member.status in (discord.Status.invisible, discord.Status.offline):
+        return await bot_utils.set_listener_role(
+            member, None, enums.MutationPriority.PRESENCE
+        )
+
+    apps = settings.get(enums.SettingsKeys.APPS)
+    user_apps = {}
+    if settings.dexists(enums.SettingsKeys.USER_APPS, str(member.id)):
+        user_apps = settings.dget(enums.SettingsKeys.USER_APPS, str(member.id))
+
+    for activity in member.activities:
+        if (
+            not isinstance(activity, discord.Spotify)
+            and isinstance(activity, discord.Activity)
+            and (
+                str(activity.application_id) in apps
+                or str(activity.application_id) in user_apps
+            )
+        ):
+            return await bot_utils.set_listener_role(
+                member,
+                bot_utils.get_desired_listener_role(member),
+                enums.MutationPriority.PRESENCE,
+            )
+
+    await bot_utils.set_listener_role(member, None, enums.MutationPriority.PRESENCE)
+
+
+def make_members(guild, roles):
+    members = []
+    for i in range(MEMBERS):
+        app_id = 10_000 + (i % KNOWN_APPS) if i % 10 else 90_000 + i
+        activities = [
+            discord.CustomActivity("vibing"),
+            discord.Game("Some game"),
+            discord.Activity(
+                name="Other", type=discord.ActivityType.playing, application_id=5
+            ),
+            discord.Activity(
+                name="Music",
+                type=discord.ActivityType.listening,
+                application_id=app_id,
+            ),
+        ]
+        members.append(
+            SimpleNamespace(
+                id=1_000_000 + i,
+                guild=guild,
+                status=discord.Status.online,
+                activities=activities,
+                roles=roles,
+            )
+        )
+    return members
+
+
+async def measure(check, members) -> float:
+    start = perf_counter()
+    for _ in range(ROUNDS):
+        for member in members:
+            await check(member)
+    return (perf_counter() - start) / (ROUNDS * len(members))
+
+
+async def main():
+    os.chdir(tempfile.mkdtemp())
+    settings = load_settings_database()
+    settings.set(
+        enums.SettingsKeys.APPS,
+        {str(10_000 + i): True for i in range(KNOWN_APPS)},
+    )
+    for i in range(0, MEMBERS, 10):
+        user_id, app_id = 1_000_000 + i, 90_000 + i
+        settings.db[enums.SettingsKeys.USER_APPS][str(user_id)] = {
+            str(app_id): {"app_id": app_id, "user_id": user_id, "timestamp": int(time())}
+        }
+
+    bot_utils = utils.BotUtils(None, load_macros_database(":memory:"), settings, None)
+    guild = SimpleNamespace(id=1)
+    for_role, listener_role = SimpleNamespace(id=2), SimpleNamespace(id=3)
+    bot_utils.listener_roles[guild.id] = {for_role.id: listener_role}
+    members = make_members(guild, [SimpleNamespace(id=guild.id), for_role, listener_role])
+
+    legacy = lambda m: legacy_check_member(bot_utils, m)
+    await measure(legacy, members)  # warm up
+    before = await measure(legacy, members)
+    after = await measure(bot_utils.check_member, members)
+    print(f"settings lookups: {before * 1e6:.2f} us per member")
+    print(f"int app ID sets:  {after * 1e6:.2f} us per member")
+    print(f"speedup: {before / after:.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+"""
+Measures the memory used for the ROLES and SPONSOR_* settings of 1000
+guilds, before and after parsing them into GuildConfig objects.
+
+The journal settings backend keeps the raw settings in memory to write its
+snapshots, so there the GuildConfig objects come on top of them. The SQLite
+backend keeps the settings on disk, so only the objects are in memory.
+
+    python -m benchmarks.bench_guild_config
+"""
+
+import json
+import tracemalloc
+
+import objects
+
+GUILDS = 1_000
+
+
+def make_settings() -> dict:
+    def role_id(guild: int, i: int) -> int:
+        return 1_000_000_000_000_000_000 + guild * 100 + i
+
+    return {
+        "roles": {
+            str(g): {str(role_id(g, i)): role_id(g, 50 + i) for i in range(3)}
+            for g in range(GUILDS)
+        },
+        "sponsor_roles": {
+            str(g): {"monthly": role_id(g, 10), "normal": role_id(g, 11)}
+            for g in range(GUILDS)
+        },
+        "sponsor_platforms": {
+            str(g): {
+                "kofi": "☕",
+                "patreon": {"emoji": "🎁", "url": "https://patreon.com/example"},
+            }
+            for g in range(GUILDS)
+        },
+        "sponsor_platform_roles": {
+            str(g): {str(role_id(g, 20)): "kofi", str(role_id(g, 21)): "patreon"}
+            for g in range(GUILDS)
+        },
+    }
+
+
+def measure(load) -> tuple[int, object]:
+    tracemalloc.start()
+    result = load()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, result
+
+
+def main():
+    data = json.dumps(make_settings())
+
+    raw_size, raw = measure(lambda: json.loads(data))
+    config_size, _ = measure(
+        lambda: {
+            int(g): objects.GuildConfig.from_settings(
+                int(g),
+                raw["roles"].get(g),
+                raw["sponsor_roles"].get(g),
+                raw["sponsor_platforms"].get(g),
+                raw["sponsor_platform_roles"].get(g),
+            )
+            for g in raw["roles"]
+        }
+    )
+
+    journal_size = raw_size + config_size
+    for name, size in (
+        ("raw settings only (before)", raw_size),
+        ("journal backend (raw settings + GuildConfig)", journal_size),
+        ("SQLite backend (GuildConfig only)", config_size),
+    ):
+        print(
+            f"{name}: {size / 1024:.0f} KiB ({size / GUILDS:.0f} B/guild, "
+            f"{size / raw_size:.2f}x of before)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Compares on_message with the previous AUTOLOG list lookup per message
+against the in-memory set of observed channels, for messages in
+observed and unobserved channels.
+
+    python -m benchmarks.bench_on_message
+"""
+
+import asyncio
+import os
+import tempfile
+
+from time import perf_counter
+from types import SimpleNamespace
+
+import enums
+import utils
+
+from utils.init_database import load_macros_database, load_settings_database
+
+OBSERVED_CHANNELS = 200
+MESSAGES = 5_000
+ROUNDS = 10
+BOT_USER_ID = 1
+
+
+async def legacy_on_message(bot_utils: utils.BotUtils, message):
+    if message.author.id == BOT_USER_ID:
+        return
+
+    is_channel_observed = bot_utils.settings.lexists(
+        enums.SettingsKeys.AUTOLOG, f"{message.guild.id}:{message.channel.id}"
+    )
+    if is_channel_observed and bot_utils.log_request_matcher.test(message.content):
+        await message.reply(bot_utils.logs_response())
+
+
+async def on_message(bot_utils: utils.BotUtils, message):
+    if message.author.id == BOT_USER_ID:
+        return
+    if not bot_utils.is_channel_observed(message):
+        return
+
+    await bot_utils.autolog(message)
+
+
+async def reply(_: str):
+    pass
+
+
+def make_messages(channel_ids: list[int]) -> list[SimpleNamespace]:
+    contents = [
+        "has anyone tried the new release yet?",
+        "it keeps showing the wrong song when I pause",
+        "can you send me the logs from yesterday",
+    ]
+    return [
+        SimpleNamespace(
+            author=SimpleNamespace(id=2),
+            guild=SimpleNamespace(id=100),
+            channel=SimpleNamespace(id=channel_ids[i % len(channel_ids)]),
+            content=contents[i % len(contents)],
+            reply=reply,
+        )
+        for i in range(MESSAGES)
+    ]
+
+
+async def measure(handler, messages) -> float:
+    start = perf_counter()
+    for _ in range(ROUNDS):
+        for message in messages:
+            await handler(message)
+    return ROUNDS * len(messages) / (perf_counter() - start)
+
+
+async def main():
+    os.chdir(tempfile.mkdtemp())
+    settings = load_settings_database()
+    for i in range(OBSERVED_CHANNELS):
+        settings.ladd(enums.SettingsKeys.AUTOLOG, f"100:{1_000 + i}")
+    bot_utils = utils.BotUtils(None, load_macros_database(":memory:"), settings, None)
+
+    legacy = lambda m: legacy_on_message(bot_utils, m)
+    current = lambda m: on_message(bot_utils, m)
+    for name, channel_ids in (
+        ("observed", [1_000 + i for i in range(OBSERVED_CHANNELS)]),
+        ("unobserved", [5_000 + i for i in range(OBSERVED_CHANNELS)]),
+    ):
+        messages = make_messages(channel_ids)
+        await measure(legacy, messages)  # warm up
+        before = await measure(legacy, messages)
+        after = await measure(current, messages)
+        print(f"{name} channels:")
+        print(f"  AUTOLOG list lookup: {before:,.0f} messages/s")
+        print(f"  observed channel set: {after:,.0f} messages/s")
+        print(f"  speedup: {after / before:.2f}x")
+    settings.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+"""
+Compares 10k settings mutations with pickledb auto-dump and JournalSettings
+on a settings file with a realistic number of registered user apps.
+
+    python -m benchmarks.bench_settings_journal
+"""
+
+import os
+import tempfile
+import pickledb
+
+from time import perf_counter
+
+from utils.settings_journal import JournalSettings
+
+MUTATIONS = 10_000
+USERS = 1_000
+
+
+def fill(settings):
+    settings.db["user_apps"] = {
+        str(user_id): {
+            str(user_id + 1): {
+                "app_id": user_id + 1,
+                "user_id": user_id,
+                "timestamp": 1_700_000_000,
+            }
+        }
+        for user_id in range(USERS)
+    }
+    settings.db["roles"] = {}
+    settings.dump()
+
+
+def mutate(settings) -> float:
+    start = perf_counter()
+    for i in range(MUTATIONS):
+        user_id = i % USERS
+        settings.dadd(
+            "user_apps",
+            (
+                str(user_id),
+                {
+                    str(user_id + 1): {
+                        "app_id": user_id + 1,
+                        "user_id": user_id,
+                        "timestamp": 1_700_000_000 + i,
+                    }
+                },
+            ),
+        )
+    return perf_counter() - start
+
+
+def main():
+    os.chdir(tempfile.mkdtemp())
+
+    pickle = pickledb.load("pickle.db", True, sig=False)
+    fill(pickle)
+    print(f"settings file: {os.path.getsize('pickle.db') / 1024:.0f} KiB")
+    before = mutate(pickle)
+
+    journal = JournalSettings("journal.db")
+    fill(journal)
+    after = mutate(journal)
+    journal.close()
+
+    print(f"pickledb auto-dump: {before:.2f}s ({MUTATIONS / before:.0f}/s)")
+    print(f"journal:            {after:.2f}s ({MUTATIONS / after:.0f}/s)")
+    print(f"speedup: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,11 @@
 import math
 import os
 import dotenv
-import dataclasses
 import discord
 import traceback
 import asyncio
 import secrets
+import signal
 
 import enums
 import objects
@@ -15,9 +15,9 @@ import utils
 
 from dateutil.parser import isoparse
 from datetime import timezone
-from asyncio import Semaphore, gather
+from asyncio import gather
+from functools import partial
 
-from time import time
 from typing import Optional
 from discord import app_commands as discord_command
 from reactionmenu import ViewMenu, ViewButton
@@ -44,7 +44,9 @@ from utils.macros_database import (
 # ------------------------------------- GLOBAL INITS
 dotenv.load_dotenv()
 
-settings = load_settings_database()
+settings = load_settings_database(
+    backend=enums.SettingsBackend(os.getenv("SETTINGS_BACKEND", "journal"))
+)
 macros = load_macros_database("macros.db")
 
 intents = discord.Intents.default()
@@ -68,31 +70,55 @@ bot_utils = utils.BotUtils(client, macros, settings, tree)
 # TODO properly remove roles from users when the bot is shut down
 @client.event
 async def on_ready():
+    bot_utils.presence_queue.start()
     for guild in client.guilds:
         await bot_utils.setup_guild(guild)
     client.loop.create_task(bot_utils.update_apps_periodically())
+    client.loop.create_task(bot_utils.flush_user_apps_periodically())
+
+
+@client.event
+async def on_guild_available(guild: discord.Guild):
+    bot_utils.index_listener_roles(guild)
 
 
 @client.event
 async def on_guild_join(guild: discord.Guild):
+    bot_utils.index_listener_roles(guild)
     await bot_utils.setup_guild(guild)
 
 
 @client.event
 async def on_guild_remove(guild: discord.Guild):
-    if settings.dexists(enums.SettingsKeys.ROLES, str(guild.id)):
-        settings.dpop(enums.SettingsKeys.ROLES, str(guild.id))
+    bot_utils.reset_listener_roles(guild)
+
+
+@client.event
+async def on_guild_role_delete(role: discord.Role):
+    bot_utils.remove_deleted_role(role)
+
+
+@client.event
+async def on_presence_update(before: discord.Member, member: discord.Member):
+    bot_utils.queue_presence_update(before, member)
+
+
+@client.event
+async def on_member_update(before: discord.Member, member: discord.Member):
+    bot_utils.queue_member_update(before, member)
 
 
 @client.event
-async def on_presence_update(_: discord.Member, member: discord.Member):
-    await bot_utils.check_member(member)
+async def on_member_remove(member: discord.Member):
+    bot_utils.listener_states.forget(member.guild.id, member.id)
 
 
 @client.event
 async def on_message(message: discord.Message):
     if message.author.id == client.user.id:
         return
+    if not bot_utils.is_channel_observed(message):
+        return
 
     await bot_utils.autolog(message)
 
@@ -139,11 +165,6 @@ async def on_app_command_error(
             pass
 
 
-# Technically we should observe updates to roles
-# that the listener roles depend on too but that happens so infrequently,
-# we might as well wait until the presence has been updated.
-
-
 # ------------------------------------- COMMANDS
 @tree.command(name=enums.Command.ROLE, description=enums.Command.ROLE.description())
 async def command_set_role(
@@ -163,32 +184,34 @@ async def command_set_role(
         )
 
     is_reset = not listener_role
-    guild_id = str(interaction.guild.id)
-    if not settings.dexists(enums.SettingsKeys.ROLES, guild_id):
+    guild_roles = bot_utils.get_guild_config(interaction.guild.id).listener_roles
+    if guild_roles is None:
         if is_reset:
             return await interaction.response.send_message(
                 "No listener roles configured"
             )
-        settings.dadd(enums.SettingsKeys.ROLES, (guild_id, {}))
+        guild_roles = {}
 
+    # Removing roles from many members takes longer
+    # than Discord waits for the first response
     if is_reset and not for_role:
+        await interaction.response.defer(thinking=True)
         await bot_utils.remove_all_listener_roles_from_all(interaction.guild)
-        settings.dpop(enums.SettingsKeys.ROLES, str(interaction.guild.id))
-        return await interaction.response.send_message(
+        bot_utils.reset_listener_roles(interaction.guild)
+        return await interaction.followup.send(
             "Removed all listener roles from all members"
         )
 
-    guild_roles = settings.dget(enums.SettingsKeys.ROLES, guild_id)
     if is_reset and for_role:
-        if str(for_role.id) in guild_roles:
+        if for_role.id in guild_roles:
+            await interaction.response.defer(thinking=True)
             listener_role = await bot_utils.clear_role_listener_of_role(
                 interaction.guild, for_role
             )
-            listener_role_id = guild_roles[str(for_role.id)]
+            listener_role_id = guild_roles[for_role.id]
             assert listener_role is not None and listener_role.id == listener_role_id
-            del guild_roles[str(for_role.id)]
-            settings.dadd(enums.SettingsKeys.ROLES, (guild_id, guild_roles))
-            return await interaction.response.send_message(
+            bot_utils.set_role_listener(interaction.guild, for_role, None)
+            return await interaction.followup.send(
                 f"Disabled monitoring for <@&{for_role.id}> "
                 f"and removed the <@&{listener_role_id}> role from all members",
                 allowed_mentions=discord.AllowedMentions(roles=False),
@@ -199,7 +222,7 @@ async def command_set_role(
                 allowed_mentions=discord.AllowedMentions(roles=False),
             )
 
-    if str(listener_role.id) in guild_roles:
+    if listener_role.id in guild_roles:
         return await interaction.response.send_message(
             f"Cannot use <@&{listener_role.id}> as a listener role. "
             "It is already used as a requirement for a listener role",
@@ -225,8 +248,7 @@ async def command_set_role(
             "Only roles without any extra permissions are allowed"
         )
 
-    guild_roles[str(for_role.id)] = listener_role.id
-    settings.dadd(enums.SettingsKeys.ROLES, (guild_id, guild_roles))
+    bot_utils.set_role_listener(interaction.guild, for_role, listener_role)
     await interaction.response.send_message(
         f"Listener role for <@&{for_role.id}> is now <@&{listener_role.id}>"
         + (f"\n{bot_utils.get_role_overview(interaction.guild)}" if summary else ""),
@@ -237,12 +259,12 @@ async def command_set_role(
 
 @tree.command(name=enums.Command.ROLES, description=enums.Command.ROLES.description())
 async def command_list_roles(interaction: discord.Interaction):
-    if not settings.dexists(enums.SettingsKeys.ROLES, str(interaction.guild.id)):
+    overview = bot_utils.get_role_overview(interaction.guild)
+    if overview is None:
         return await interaction.response.send_message(
             "No listener roles configured for this server"
         )
 
-    overview = bot_utils.get_role_overview(interaction.guild)
     await interaction.response.send_message(
         overview,
         allowed_mentions=discord.AllowedMentions(roles=False),
@@ -430,31 +452,34 @@ async def command_date_role(
             ephemeral=True,
         )
 
-    sem = Semaphore(1)
-
-    async def try_add_role(member):
-        async with sem:
-            if role not in member.roles:
-                try:
-                    await member.add_roles(role)
-                    return True
-                except discord.Forbidden:
-                    return None
-            return False
+    def role_added(member: discord.Member, change: asyncio.Future):
+        if not change.cancelled() and change.exception() is not None:
+            print(
+                f"Failed to give role {role.id} to member {member.id} "
+                f"in {interaction.guild.id}: {change.exception()}"
+            )
 
-    tasks = [
-        try_add_role(member)
+    # Only queued, since giving the role to every member can take longer
+    # than the interaction can still be responded to
+    members = [
+        member
         for member in interaction.guild.members
         if not member.bot
         and member.joined_at
         and member.joined_at.astimezone(timezone.utc) >= parsed
+        and role not in member.roles
     ]
+    for member in members:
+        change = bot_utils.role_scheduler.enqueue(
+            interaction.guild.id,
+            enums.MutationPriority.SWEEP,
+            partial(member.add_roles, role),
+        )
+        change.add_done_callback(partial(role_added, member))
 
-    results = await gather(*tasks)
-    count = sum(1 for result in results if result)
-
+    count = len(members)
     await interaction.followup.send(
-        f"✅ Gave {role.mention} to {count} member{'s' if count != 1 else ''} who joined after <t:{int(parsed.timestamp())}:f>",
+        f"✅ Giving {role.mention} to {count} member{'s' if count != 1 else ''} who joined after <t:{int(parsed.timestamp())}:f>",
         allowed_mentions=discord.AllowedMentions(roles=False),
         ephemeral=True,
     )
@@ -479,8 +504,10 @@ async def command_listening_role(
 
     user_id = guild_member.id
     if delete:
-        settings.dpop(enums.SettingsKeys.USER_APPS, str(user_id))
-        await bot_utils.check_member(guild_member)
+        bot_utils.delete_user_apps(user_id)
+        await bot_utils.check_member(
+            guild_member, enums.MutationPriority.INTERACTIVE
+        )
         await interaction.response.send_message(
             f"Removed any registered app IDs for <@{user_id}>"
         )
@@ -497,22 +524,13 @@ async def command_listening_role(
             if app_id is None:
                 continue
 
-            if settings.dexists(enums.SettingsKeys.APPS, str(app_id)):
+            if bot_utils.is_known_app(app_id):
                 await interaction.response.send_message(
                     f"App ID `{app_id}` is already known"
                 )
                 return
 
-            if not settings.dexists(enums.SettingsKeys.USER_APPS, str(user_id)):
-                settings.dadd(enums.SettingsKeys.USER_APPS, (str(user_id), {}))
-
-            user_apps = settings.dget(enums.SettingsKeys.USER_APPS, str(user_id))
-            # Only one custom app ID is allowed per user.
-            user_apps.clear()
-            user_apps[str(app_id)] = dataclasses.asdict(
-                objects.UserApp(app_id, user_id=guild_member.id, timestamp=int(time()))
-            )
-            settings.dadd(enums.SettingsKeys.USER_APPS, (str(user_id), user_apps))
+            bot_utils.register_user_app(user_id, app_id)
             await interaction.response.send_message(
                 f"Registered listening role for app ID `{app_id}` for <@{user_id}>"
             )
@@ -523,18 +541,57 @@ async def command_listening_role(
             f"No app ID found, make sure your presence is visible"
         )
 
-    await bot_utils.check_member(guild_member)
+    await bot_utils.check_member(guild_member, enums.MutationPriority.INTERACTIVE)
 
 
-@tree.command(name=enums.Command.STOP, description=enums.Command.STOP.description())
-async def command_stop(interaction: discord.Interaction):
-    for guild in client.guilds:
-        await bot_utils.remove_all_listener_roles_from_all(guild)
+@tree.command(
+    name=enums.Command.APP_USERS, description=enums.Command.APP_USERS.description()
+)
+@discord_command.describe(
+    app_id="The custom app ID", revoke="Remove the app ID from all of its users"
+)
+async def command_app_users(
+    interaction: discord.Interaction, app_id: str, revoke: Optional[bool]
+):
+    if not app_id.isdigit():
+        return await interaction.response.send_message(
+            f"`{app_id}` is not an app ID", ephemeral=True
+        )
+
+    if revoke:
+        await interaction.response.defer(thinking=True)
+        user_ids = await bot_utils.revoke_user_app(int(app_id))
+        return await interaction.followup.send(
+            f"Revoked app ID `{app_id}` from {len(user_ids)} "
+            f"user{'s' if len(user_ids) != 1 else ''}"
+        )
+
+    user_ids = bot_utils.get_app_users(int(app_id))
+    if not user_ids:
+        return await interaction.response.send_message(
+            f"No users registered app ID `{app_id}`"
+        )
+    await interaction.response.send_message(
+        f"App ID `{app_id}` is registered by {len(user_ids)} "
+        f"user{'s' if len(user_ids) != 1 else ''}: "
+        + ", ".join(f"<@{user_id}>" for user_id in sorted(user_ids)),
+        allowed_mentions=discord.AllowedMentions(users=False),
+    )
 
-    await interaction.response.send_message("Removed all roles, stopping now")
-    await client.close()
 
-    settings._autodumpdb()
+@tree.command(name=enums.Command.STOP, description=enums.Command.STOP.description())
+async def command_stop(interaction: discord.Interaction):
+    await interaction.response.defer(thinking=True)
+    try:
+        await gather(
+            *(
+                bot_utils.remove_all_listener_roles_from_all(guild)
+                for guild in client.guilds
+            )
+        )
+        await interaction.followup.send("Removed all roles, stopping now")
+    finally:
+        await client.close()
 
 
 @tree.command(name=enums.Command.LOGS, description=enums.Command.LOGS.description())
@@ -765,22 +822,7 @@ platform_group = discord_command.Group(
 async def sponsor_platform_add(
         interaction: discord.Interaction, name: str, emoji: str, role: discord.Role,  url: Optional[str] = None,
 ):
-    guild_id = str(interaction.guild.id)
-
-    if not settings.dexists(enums.SettingsKeys.SPONSOR_PLATFORMS, guild_id):
-        settings.dadd(enums.SettingsKeys.SPONSOR_PLATFORMS, (guild_id, {}))
-
-    if not settings.dexists(enums.SettingsKeys.SPONSOR_PLATFORM_ROLES, guild_id):
-        settings.dadd(enums.SettingsKeys.SPONSOR_PLATFORM_ROLES, (guild_id, {}))
-
-    platforms = settings.dget(enums.SettingsKeys.SPONSOR_PLATFORMS, guild_id)
-    platforms[name] = {"emoji": emoji, "url": url}
-    settings.dadd(enums.SettingsKeys.SPONSOR_PLATFORMS, (guild_id, platforms))
-
-    role_map = settings.dget(enums.SettingsKeys.SPONSOR_PLATFORM_ROLES, guild_id)
-    role_map[str(role.id)] = name
-    settings.dadd(enums.SettingsKeys.SPONSOR_PLATFORM_ROLES, (guild_id, role_map))
-
+    bot_utils.add_sponsor_platform(interaction.guild, name, emoji, role, url)
     await interaction.response.send_message(
         f"Platform `{name}` set to {emoji} for {role.mention}"
         + (f" ([Link]({url}))" if url else ""),
@@ -801,40 +843,16 @@ async def sponsor_platform_edit(
     role: Optional[discord.Role] = None,
     url: Optional[str] = None,
 ):
-    guild_id = str(interaction.guild.id)
-
-    if not settings.dexists(enums.SettingsKeys.SPONSOR_PLATFORMS, guild_id):
+    if not bot_utils.get_platform_names(interaction.guild):
         return await interaction.response.send_message(
             "No platforms configured", ephemeral=True
         )
 
-    platforms = settings.dget(enums.SettingsKeys.SPONSOR_PLATFORMS, guild_id)
-    if name not in platforms:
+    if not bot_utils.edit_sponsor_platform(interaction.guild, name, emoji, role, url):
         return await interaction.response.send_message(
             f"Platform `{name}` not found", ephemeral=True
         )
 
-    if isinstance(platforms[name], str):  # legacy format migration
-        platforms[name] = {"emoji": platforms[name], "url": None}
-
-    if emoji:
-        platforms[name]["emoji"] = emoji
-    if url is not None:
-        platforms[name]["url"] = url  # allow clearing with empty string
-
-    settings.dadd(enums.SettingsKeys.SPONSOR_PLATFORMS, (guild_id, platforms))
-
-    if role is not None:
-        if not settings.dexists(enums.SettingsKeys.SPONSOR_PLATFORM_ROLES, guild_id):
-            settings.dadd(enums.SettingsKeys.SPONSOR_PLATFORM_ROLES, (guild_id, {}))
-
-        role_map = settings.dget(enums.SettingsKeys.SPONSOR_PLATFORM_ROLES, guild_id)
-        for rid, plat in list(role_map.items()):
-            if plat == name:
-                del role_map[rid]
-        role_map[str(role.id)] = name
-        settings.dadd(enums.SettingsKeys.SPONSOR_PLATFORM_ROLES, (guild_id, role_map))
-
     await interaction.response.send_message(
         f"Platform `{name}` updated",
         ephemeral=True,
@@ -848,33 +866,16 @@ async def sponsor_platform_edit(
     description=enums.Command.SPONSOR_PLATFORM_DELETE.description(),
 )
 async def sponsor_platform_delete(interaction: discord.Interaction, name: str):
-    guild_id = str(interaction.guild.id)
-
-    if not settings.dexists(enums.SettingsKeys.SPONSOR_PLATFORMS, guild_id):
+    if not bot_utils.get_platform_names(interaction.guild):
         return await interaction.response.send_message(
             "No platforms configured", ephemeral=True
         )
 
-    platforms = settings.dget(enums.SettingsKeys.SPONSOR_PLATFORMS, guild_id)
-    if name not in platforms:
+    if not bot_utils.delete_sponsor_platform(interaction.guild, name):
         return await interaction.response.send_message(
             f"Platform `{name}` not found", ephemeral=True
         )
 
-    del platforms[name]
-    settings.dadd(enums.SettingsKeys.SPONSOR_PLATFORMS, (guild_id, platforms))
-
-    if settings.dexists(enums.SettingsKeys.SPONSOR_PLATFORM_ROLES, guild_id):
-        role_map = settings.dget(
-            enums.SettingsKeys.SPONSOR_PLATFORM_ROLES, guild_id
-        )
-        to_del = [rid for rid, n in role_map.items() if n == name]
-        for rid in to_del:
-            del role_map[rid]
-        settings.dadd(
-            enums.SettingsKeys.SPONSOR_PLATFORM_ROLES, (guild_id, role_map)
-        )
-
     await interaction.response.send_message(
         f"Platform `{name}` deleted", ephemeral=True
     )
@@ -915,19 +916,7 @@ async def sponsor_subroles(
     monthly_role: Optional[discord.Role],
     normal_role: Optional[discord.Role],
 ):
-    guild_id = str(interaction.guild.id)
-
-    if not settings.dexists(enums.SettingsKeys.SPONSOR_ROLES, guild_id):
-        settings.dadd(enums.SettingsKeys.SPONSOR_ROLES, (guild_id, {}))
-
-    roles_cfg = settings.dget(enums.SettingsKeys.SPONSOR_ROLES, guild_id)
-
-    if monthly_role:
-        roles_cfg["monthly"] = monthly_role.id
-    if normal_role:
-        roles_cfg["normal"] = normal_role.id
-
-    settings.dadd(enums.SettingsKeys.SPONSOR_ROLES, (guild_id, roles_cfg))
+    bot_utils.set_sponsor_roles(interaction.guild, monthly_role, normal_role)
 
     await interaction.response.send_message(
         "Sponsor roles updated", ephemeral=True,
@@ -1018,6 +1007,46 @@ async def command_autolog(
         await interaction.response.send_message(f"Nothing to do.")
 
 
+@tree.command(
+    name=enums.Command.AUTOLOG_PATTERN,
+    description=enums.Command.AUTOLOG_PATTERN.description(),
+)
+@discord_command.describe(
+    action="Whether to add, remove or list patterns",
+    pattern="An RE2 regular expression, matched case-insensitively anywhere in a message",
+)
+@discord_command.choices(
+    action=[
+        discord_command.Choice(name=action, value=action)
+        for action in enums.AutologPatternAction
+    ]
+)
+async def command_autolog_pattern(
+    interaction: discord.Interaction,
+    action: discord_command.Choice[str],
+    pattern: Optional[str],
+):
+    action = enums.AutologPatternAction(action.value)
+    if action is enums.AutologPatternAction.LIST:
+        return await interaction.response.send_message(
+            bot_utils.list_autolog_patterns(interaction.guild.id),
+            allowed_mentions=discord.AllowedMentions.none(),
+        )
+    if not pattern:
+        return await interaction.response.send_message(
+            "Please specify a pattern", ephemeral=True
+        )
+
+    if action is enums.AutologPatternAction.ADD:
+        reply_message = bot_utils.add_autolog_pattern(interaction.guild.id, pattern)
+    else:
+        reply_message = bot_utils.remove_autolog_pattern(interaction.guild.id, pattern)
+    # patterns are echoed back and may contain mentions
+    await interaction.response.send_message(
+        reply_message, allowed_mentions=discord.AllowedMentions.none()
+    )
+
+
 giveaway_pool = []
 
 giveaway_group = discord_command.Group(name="giveaway", description="Giveaway commands")
@@ -1090,4 +1119,17 @@ async def command_giveaway_clear(interaction: discord.Interaction):
 
 tree.add_command(giveaway_group)
 
-client.run(os.getenv("BOT_TOKEN"))
+async def main():
+    async with bot_utils.http, client:
+        await client.start(os.getenv("BOT_TOKEN"))
+
+
+# Stop on SIGTERM the same way as on Ctrl+C, so settings are written below
+signal.signal(signal.SIGTERM, signal.default_int_handler)
+try:
+    asyncio.run(main())
+except KeyboardInterrupt:
+    pass
+finally:
+    bot_utils.flush_user_apps()
+    settings.close()
@@ -3,3 +3,6 @@ from .help_topic import HelpTopic
 from .platform import Platform
 from .autolog_state import AutologState
 from .settings_keys import SettingsKeys
+from .mutation_priority import MutationPriority
+from .settings_backend import SettingsBackend
+from .autolog_pattern_action import AutologPatternAction
@@ -0,0 +1,7 @@
+from enum import StrEnum
+
+
+class AutologPatternAction(StrEnum):
+    ADD = "Add"
+    REMOVE = "Remove"
+    LIST = "List"
@@ -6,6 +6,7 @@ class Command(StrEnum):
     ROLES = "roles"
     JOINED = "joined"
     LISTENING = "listening"
+    APP_USERS = "app-users"
     STOP = "stop"
     LOGS = "logs"
     HELP = "help"
@@ -17,6 +18,7 @@ class Command(StrEnum):
     MACROS_LIST = "list"
     MACROS_DELETE = "delete"
     AUTOLOG = "autolog"
+    AUTOLOG_PATTERN = "autolog-pattern"
     DATEROLE = "daterole"
     INFO = "info"
     SPONSOR = "sponsor"
@@ -35,6 +37,7 @@ class Command(StrEnum):
             self.ROLES: "List all listener roles and their respective parent roles",
             self.JOINED: "Check the join time of yourself or another user with some extras",
             self.LISTENING: "Register your currently active listening status for the listener role",
+            self.APP_USERS: "List or revoke the users that registered a custom app ID",
             self.STOP: "Stop the bot and remove the listener role from all members in all servers",
             self.LOGS: "Tells you where the Music Presence logs are located",
             self.HELP: "Use this command if you need help with Music Presence",
@@ -46,6 +49,7 @@ class Command(StrEnum):
             self.MACROS_LIST: "Lists all created macros.",
             self.MACROS_DELETE: "Deletes a macro.",
             self.AUTOLOG: "Automaticaly reply logs locations to a user asking for logs when his message match a regex.",
+            self.AUTOLOG_PATTERN: "Add, remove or list the patterns that make autolog reply in this server, next to the built-in ones.",
             self.DATEROLE: "Assign a role to all members who joined after a specific date.",
             self.INFO: "Display join date and sponsorship info for a member.",
             self.SPONSOR: "Manage sponsorship settings.",
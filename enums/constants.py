@@ -3,8 +3,35 @@ import enums
 MUSIC_APP_ID = 1205619376275980288
 PODCAST_APP_ID = 1292142821482172506
 PLAYERS_JSON_URL = "https://live.musicpresence.app/v3/players.min.json"
+PLAYERS_CACHE_FILE = "players.json"
+PLAYERS_REFRESH_INTERVAL = 60 * 60 * 8  # 8 hours (in seconds)
+PLAYERS_RETRY_BASE = 30  # seconds before the first retry, doubled each time
+PLAYERS_RETRY_MAX = 60 * 60  # 1 hour (in seconds)
 MAX_USER_APP_ID_RETENTION = 60 * 60 * 24 * 30  # 30 days (in seconds)
 MIN_RETENTION_UPDATE_INTERVAL = 60 * 60 * 24  # 24 hours (in seconds)
+USER_APP_FLUSH_INTERVAL = 60  # seconds between writing user app timestamps
+PRESENCE_WORKERS = 4  # concurrent member checks for presence updates
+# discord.py already waits out the per-route limits Discord reports with each
+# response, this only keeps bulk changes in one guild from taking up most of
+# the global limit of 50 requests per second shared by all guilds
+ROLE_MUTATION_RATE = 5.0  # role changes per second and guild
+ROLE_MUTATION_BURST = 10
+ROLE_MUTATION_MAX_RETRIES = 5
+SWEEP_GUILD_CONCURRENCY = 4  # guilds checked at the same time
+SWEEP_YIELD_INTERVAL = 100  # members checked before yielding to other tasks
+AUTOLOG_REPLY_COOLDOWN = 60  # seconds before replying with the logs again
+AUTOLOG_REPLY_PER_USER = False  # the cooldown is per user instead of per channel
+AUTOLOG_REPLY_MAX_ENTRIES = 10_000  # channels or users remembered
+AUTOLOG_MAX_PATTERNS = 20  # custom autolog patterns per guild
+AUTOLOG_PATTERN_MAX_LENGTH = 200
+AUTOLOG_PATTERN_MAX_INPUT = 1000  # message characters custom patterns see
+AUTOLOG_MATCHER_CACHE_SIZE = 256  # guilds with compiled custom patterns
+HTTP_CONNECT_TIMEOUT = 5  # seconds
+HTTP_READ_TIMEOUT = 10  # seconds without receiving any data
+HTTP_TOTAL_TIMEOUT = 30  # seconds
+HTTP_KEEPALIVE_TIMEOUT = 60  # seconds an idle connection is kept open
+HTTP_CONNECTIONS_PER_HOST = 4
+HTTP_MAX_RESPONSE_SIZE = 5 * 1024 * 1024  # 5 MiB
 
 ROLE_BETA_TESTER = 1349699182968967219
 ROLES_OS = [1295480990722035752, 1295480950242676737, 1295480841987821628]
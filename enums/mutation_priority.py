@@ -0,0 +1,7 @@
+from enum import IntEnum
+
+
+class MutationPriority(IntEnum):
+    INTERACTIVE = 0
+    PRESENCE = 1
+    SWEEP = 2
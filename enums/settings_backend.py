@@ -0,0 +1,6 @@
+from enum import StrEnum
+
+
+class SettingsBackend(StrEnum):
+    JOURNAL = "journal"
+    SQLITE = "sqlite"
@@ -3,6 +3,7 @@ from enum import StrEnum
 
 class SettingsKeys(StrEnum):
     AUTOLOG = "autolog"
+    AUTOLOG_PATTERNS = "autolog_patterns"
     APPS = "apps"
     USER_APPS = "user_apps"
     ROLES = "roles"
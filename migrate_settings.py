@@ -0,0 +1,239 @@
+"""
+Migrates a settings file (settings.N.db) to the SQLite settings backend
+without running the bot, then verifies the result.
+
+    python migrate_settings.py settings.0.db settings.0.sqlite3
+
+The settings file and its journal are only read, never written, and are
+read one top-level key at a time, so only the largest setting has to fit
+in memory.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+from collections.abc import Iterator
+from time import perf_counter
+from typing import Any, TextIO
+
+import enums
+
+from utils.settings_journal import (
+    COMPACTING_SUFFIX,
+    JOURNAL_SUFFIX,
+    apply_record,
+    iter_journal,
+)
+from utils.settings_sqlite import NESTED_TABLES, SqliteSettings
+
+READ_SIZE = 1024 * 1024
+
+
+class SnapshotReader:
+    """
+    Reads the JSON object of a snapshot entry by entry. A value is decoded
+    once enough of the file was read for it, reading twice as much as the
+    last time whenever that was not enough yet.
+    """
+
+    def __init__(self, f: TextIO):
+        self.f = f
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _read(self, size: int = READ_SIZE):
+        data = self.f.read(size)
+        self.eof = data == ""
+        self.buffer = self.buffer[self.pos :] + data
+        self.pos = 0
+
+    def peek(self) -> str:
+        """
+        Skips whitespace and returns the next character without consuming it.
+        """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if self.eof:
+                raise ValueError("unexpected end of the settings file")
+            self._read()
+
+    def expect(self, *expected: str) -> str:
+        token = self.peek()
+        if token not in expected:
+            raise ValueError(f"expected {' or '.join(expected)}, found {token!r}")
+        self.pos += 1
+        return token
+
+    def value(self) -> Any:
+        self.peek()
+        size = READ_SIZE
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # a number might continue in the next part of the file
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._read(size)
+            size *= 2
+
+    def entries(self) -> Iterator[tuple[str, Any]]:
+        self.expect("{")
+        if self.peek() == "}":
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key, self.value()
+            if self.expect(",", "}") == "}":
+                return
+
+
+def read_journal(location: str) -> dict[str, list[list]]:
+    """
+    Returns the records of the journal that are not part of the snapshot
+    yet, by the key they change.
+    """
+    records: dict[str, list[list]] = {}
+    for journal_location in (location + COMPACTING_SUFFIX, location + JOURNAL_SUFFIX):
+        if os.path.exists(journal_location):
+            for record in iter_journal(journal_location):
+                records.setdefault(record[1], []).append(record)
+    return records
+
+
+def iter_settings(location: str) -> Iterator[tuple[str, Any]]:
+    """
+    Yields the settings of a settings file by key, with the changes from its
+    journal applied, without changing any file.
+    """
+    journal = read_journal(location)
+    if os.path.exists(location):
+        with open(location, "rt") as f:
+            for key, value in SnapshotReader(f).entries():
+                db = {key: value}
+                for record in journal.pop(key, ()):
+                    apply_record(db, *record)
+                if key in db:
+                    yield key, db[key]
+    for key, records in journal.items():
+        db = {}
+        for record in records:
+            apply_record(db, *record)
+        if key in db:
+            yield key, db[key]
+
+
+def normalize(key: str, value: Any) -> Any:
+    """
+    Returns a legacy value in the shape the SQLite backend returns it in.
+    Only the differences the backend is meant to have are taken care of,
+    anything else it lost shows up as a mismatch.
+    """
+    if key == enums.SettingsKeys.SPONSOR_PLATFORMS:
+        return {
+            guild_id: {
+                name: (
+                    {"emoji": data, "url": None}  # legacy format
+                    if isinstance(data, str)
+                    else {"emoji": None, "url": None, **data}
+                )
+                for name, data in platforms.items()
+            }
+            for guild_id, platforms in value.items()
+        }
+    if key == enums.SettingsKeys.AUTOLOG:
+        return sorted(set(value))
+    return value
+
+
+def count_records(key: str, value: Any) -> int:
+    if key in NESTED_TABLES:
+        return sum(len(inner) for inner in value.values())
+    return len(value) if isinstance(value, (dict, list)) else 1
+
+
+def checksum(value: Any) -> str:
+    return hashlib.sha256(
+        json.dumps(value, sort_keys=True, ensure_ascii=False).encode()
+    ).hexdigest()
+
+
+def migrate(source: Iterator[tuple[str, Any]], target: SqliteSettings) -> int:
+    migrated = 0
+    for key, value in source:
+        start = perf_counter()
+        target.set(key, value)
+        records = count_records(key, value)
+        migrated += records
+        print(f"{key}: {records} records in {perf_counter() - start:.2f}s")
+    return migrated
+
+
+def verify(source: Iterator[tuple[str, Any]], target: SqliteSettings) -> bool:
+    ok = True
+    for key, value in source:
+        expected = normalize(key, value)
+        actual = target.get(key)
+        if key == enums.SettingsKeys.AUTOLOG:
+            actual = sorted(actual)
+
+        expected_count = count_records(key, expected)
+        actual_count = count_records(key, actual)
+        if expected_count != actual_count:
+            print(f"{key}: expected {expected_count} records, found {actual_count}")
+            ok = False
+        elif checksum(expected) != checksum(actual):
+            print(f"{key}: checksum mismatch")
+            ok = False
+        else:
+            print(f"{key}: {actual_count} records, sha256 {checksum(actual)[:16]}")
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("source", help="settings file, e.g. settings.0.db")
+    parser.add_argument("target", help="SQLite file, e.g. settings.0.sqlite3")
+    parser.add_argument(
+        "--force", action="store_true", help="replace the target if it exists"
+    )
+    args = parser.parse_args()
+
+    if os.path.exists(args.target):
+        if not args.force:
+            print(f"{args.target} already exists, use --force to replace it")
+            return 1
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.target + suffix):
+                os.remove(args.target + suffix)
+
+    target = SqliteSettings(args.target)
+    start = perf_counter()
+    migrated = migrate(iter_settings(args.source), target)
+    duration = perf_counter() - start
+    print(
+        f"Migrated {migrated} records in {duration:.2f}s "
+        f"({migrated / max(duration, 1e-9):.0f} records/s)"
+    )
+
+    # Reads the source again, so nothing the migration did can hide a change
+    ok = verify(iter_settings(args.source), target)
+    target.close()
+    print("Verification passed" if ok else "Verification FAILED")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,15 @@
 from .user_app import UserApp
 from .link_buttons import LinkButtons
 from .log_request_matcher import LogRequestMatcher
+from .coalescing_queue import CoalescingQueue
+from .listener_state_cache import ListenerStateCache
+from .role_mutation_scheduler import RoleMutationScheduler
+from .guild_config import GuildConfig, SponsorPlatform
+from .user_app_registry import UserAppRegistry
+from .reply_throttle import ReplyThrottle
+from .autolog_pattern_matcher import (
+    AutologPatternCache,
+    AutologPatternMatcher,
+    InvalidAutologPattern,
+    compile_autolog_pattern,
+)
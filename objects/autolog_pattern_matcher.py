@@ -0,0 +1,88 @@
+import re2
+
+from collections import OrderedDict
+
+# memory for compiling a single pattern
+MAX_PATTERN_MEMORY = 1024 * 1024
+
+
+class InvalidAutologPattern(Exception):
+    pass
+
+
+def compile_autolog_pattern(pattern: str):
+    """
+    Compiles a pattern with RE2, which matches in linear time without
+    backtracking, so no pattern can stall the bot however it is written.
+    RE2 does not support backreferences and lookarounds.
+    """
+    options = re2.Options()
+    options.case_sensitive = False
+    options.never_capture = True
+    options.log_errors = False
+    options.max_mem = MAX_PATTERN_MEMORY
+    try:
+        return re2.compile(pattern, options)
+    except re2.error as e:
+        message = e.args[0] if e.args else "invalid pattern"
+        if isinstance(message, bytes):
+            message = message.decode(errors="replace")
+        raise InvalidAutologPattern(message) from None
+
+
+class AutologPatternMatcher:
+    """
+    The custom autolog patterns of a guild, compiled with RE2. A pattern
+    only sees the first max_input characters of a message, which bounds
+    the time a message takes to max_input times the number of patterns.
+    """
+
+    def __init__(self, patterns: tuple[str, ...], max_input: int):
+        self.patterns = patterns
+        self.max_input = max_input
+        self.compiled = []
+        for pattern in patterns:
+            try:
+                self.compiled.append(compile_autolog_pattern(pattern))
+            except InvalidAutologPattern as e:
+                # only possible when the settings were edited by hand
+                print(f"Ignoring autolog pattern {pattern!r}: {e}")
+
+    def test(self, message: str) -> bool:
+        message = message[: self.max_input]
+        return any(pattern.search(message) for pattern in self.compiled)
+
+
+class AutologPatternCache:
+    """
+    The compiled matchers of the guilds that have custom autolog patterns.
+    At most max_entries are kept; the least recently used are dropped first
+    and compiled again when they are needed.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.matchers: OrderedDict[int, AutologPatternMatcher] = OrderedDict()
+        self.compiled = 0
+
+    def __len__(self) -> int:
+        return len(self.matchers)
+
+    def get(self, guild_id: int) -> AutologPatternMatcher | None:
+        matcher = self.matchers.get(guild_id)
+        if matcher is not None:
+            self.matchers.move_to_end(guild_id)
+        return matcher
+
+    def put(self, guild_id: int, matcher: AutologPatternMatcher):
+        self.compiled += 1
+        self.matchers[guild_id] = matcher
+        self.matchers.move_to_end(guild_id)
+        while len(self.matchers) > self.max_entries:
+            self.matchers.popitem(last=False)
+
+    def invalidate(self, guild_id: int):
+        self.matchers.pop(guild_id, None)
+
+    def stats(self) -> str:
+        return f"{len(self.matchers)} cached, {self.compiled} compiled"
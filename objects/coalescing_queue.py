@@ -0,0 +1,83 @@
+import asyncio
+import traceback
+
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+
+class CoalescingQueue:
+    """
+    Runs a handler for the latest value put under a key, using a fixed
+    number of worker tasks. Values put while the same key is still waiting
+    replace the waiting value instead of queueing another run, and a key
+    is never handled by two workers at the same time.
+    """
+
+    def __init__(self, handler: Callable[[Any], Awaitable[None]], workers: int):
+        self.handler = handler
+        self.worker_count = workers
+        self.workers: list[asyncio.Task] = []
+        self.keys: asyncio.Queue[Hashable] = asyncio.Queue()
+        self.latest: dict[Hashable, Any] = {}
+        self.running: set[Hashable] = set()
+        self.enqueued = 0
+        self.coalesced = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self.latest)
+
+    @property
+    def coalesce_ratio(self) -> float:
+        if self.enqueued == 0:
+            return 0.0
+        return self.coalesced / self.enqueued
+
+    def put(self, key: Hashable, value: Any):
+        self.enqueued += 1
+        if key in self.latest:
+            self.coalesced += 1
+            self.latest[key] = value
+            return
+
+        self.latest[key] = value
+        if key not in self.running:
+            self.keys.put_nowait(key)
+
+    def start(self):
+        if self.workers:
+            return
+        self.workers = [
+            asyncio.create_task(self._work()) for _ in range(self.worker_count)
+        ]
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    async def join(self):
+        await self.keys.join()
+
+    def stats(self) -> str:
+        return (
+            f"depth {self.depth}, {self.enqueued} enqueued, "
+            f"{self.coalesced} coalesced ({self.coalesce_ratio:.1%})"
+        )
+
+    async def _work(self):
+        while True:
+            key = await self.keys.get()
+            value = self.latest.pop(key)
+            self.running.add(key)
+            try:
+                await self.handler(value)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                self.running.discard(key)
+                if key in self.latest:
+                    # updated while it was being handled
+                    self.keys.put_nowait(key)
+                self.keys.task_done()
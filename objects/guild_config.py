@@ -0,0 +1,108 @@
+from typing import Any
+
+
+class SponsorPlatform:
+    __slots__ = ("emoji", "url")
+
+    def __init__(self, emoji: str, url: str | None = None):
+        self.emoji = emoji
+        self.url = url
+
+    @classmethod
+    def from_setting(cls, data: str | dict) -> "SponsorPlatform":
+        if isinstance(data, str):  # legacy format
+            return cls(data)
+        return cls(data.get("emoji", ""), data.get("url"))
+
+    def to_setting(self) -> dict:
+        return {"emoji": self.emoji, "url": self.url}
+
+
+class GuildConfig:
+    """
+    The settings of a single guild with integer IDs, parsed once from the
+    ROLES and SPONSOR_* settings and written back by BotUtils on changes.
+    """
+
+    __slots__ = (
+        "guild_id",
+        "listener_roles",
+        "sponsor_monthly_role_id",
+        "sponsor_normal_role_id",
+        "sponsor_platforms",
+        "sponsor_platform_roles",
+    )
+
+    def __init__(self, guild_id: int):
+        self.guild_id = guild_id
+        # for role id -> listener role id, None if nothing is configured
+        self.listener_roles: dict[int, int] | None = None
+        self.sponsor_monthly_role_id: int | None = None
+        self.sponsor_normal_role_id: int | None = None
+        # platform name -> platform
+        self.sponsor_platforms: dict[str, SponsorPlatform] = {}
+        # role id -> platform name
+        self.sponsor_platform_roles: dict[int, str] = {}
+
+    @classmethod
+    def from_settings(
+        cls,
+        guild_id: int,
+        roles: dict[str, int] | None,
+        sponsor_roles: dict[str, Any] | None,
+        sponsor_platforms: dict[str, str | dict] | None,
+        sponsor_platform_roles: dict[str, str] | None,
+    ) -> "GuildConfig":
+        config = cls(guild_id)
+        if roles is not None:
+            config.listener_roles = {
+                int(role_id): int(listener_role_id)
+                for role_id, listener_role_id in roles.items()
+            }
+        if sponsor_roles:
+            if sponsor_roles.get("monthly"):
+                config.sponsor_monthly_role_id = int(sponsor_roles["monthly"])
+            if sponsor_roles.get("normal"):
+                config.sponsor_normal_role_id = int(sponsor_roles["normal"])
+        if sponsor_platforms:
+            config.sponsor_platforms = {
+                name: SponsorPlatform.from_setting(data)
+                for name, data in sponsor_platforms.items()
+            }
+        if sponsor_platform_roles:
+            config.sponsor_platform_roles = {
+                int(role_id): name for role_id, name in sponsor_platform_roles.items()
+            }
+        return config
+
+    def roles_setting(self) -> dict[str, int]:
+        return {
+            str(role_id): listener_role_id
+            for role_id, listener_role_id in (self.listener_roles or {}).items()
+        }
+
+    def sponsor_roles_setting(self) -> dict[str, int]:
+        result = {}
+        if self.sponsor_monthly_role_id is not None:
+            result["monthly"] = self.sponsor_monthly_role_id
+        if self.sponsor_normal_role_id is not None:
+            result["normal"] = self.sponsor_normal_role_id
+        return result
+
+    def sponsor_platforms_setting(self) -> dict[str, dict]:
+        return {
+            name: platform.to_setting()
+            for name, platform in self.sponsor_platforms.items()
+        }
+
+    def sponsor_platform_roles_setting(self) -> dict[str, str]:
+        return {
+            str(role_id): name for role_id, name in self.sponsor_platform_roles.items()
+        }
+
+    def platform_role_ids(self, name: str) -> list[int]:
+        return [
+            role_id
+            for role_id, platform in self.sponsor_platform_roles.items()
+            if platform == name
+        ]
@@ -0,0 +1,64 @@
+class ListenerStateCache:
+    """
+    Per guild, the listener role IDs each member has been given by the bot
+    and whether that change is still pending, i.e. it was requested but not
+    yet observed in a gateway member update.
+    """
+
+    def __init__(self):
+        self.states: dict[int, dict[int, tuple[frozenset[int], bool]]] = {}
+
+    def get(self, guild_id: int, member_id: int) -> frozenset[int] | None:
+        state = self.states.get(guild_id, {}).get(member_id)
+        return state[0] if state is not None else None
+
+    def is_pending(self, guild_id: int, member_id: int) -> bool:
+        state = self.states.get(guild_id, {}).get(member_id)
+        return state is not None and state[1]
+
+    def set(
+        self,
+        guild_id: int,
+        member_id: int,
+        role_ids: frozenset[int],
+        pending: bool = False,
+    ):
+        self.states.setdefault(guild_id, {})[member_id] = (role_ids, pending)
+
+    def confirm(self, guild_id: int, member_id: int, role_ids: frozenset[int]):
+        # The request for the change succeeded. The gateway update might
+        # never come, e.g. when nothing changed or it was missed during a
+        # resume, so the change is not waited for any longer.
+        guild_states = self.states.get(guild_id)
+        if guild_states is not None and guild_states.get(member_id) == (
+            role_ids,
+            True,
+        ):
+            guild_states[member_id] = (role_ids, False)
+
+    def reconcile(
+        self, guild_id: int, member_id: int, observed: frozenset[int]
+    ) -> bool:
+        """
+        Returns whether someone else changed the listener roles of the member,
+        which then need to be checked again.
+        """
+        guild_states = self.states.get(guild_id)
+        if guild_states is None or member_id not in guild_states:
+            return False
+
+        role_ids, pending = guild_states[member_id]
+        if observed == role_ids:
+            guild_states[member_id] = (role_ids, False)
+        elif not pending:
+            guild_states[member_id] = (observed, False)
+            return True
+        return False
+
+    def forget(self, guild_id: int, member_id: int):
+        guild_states = self.states.get(guild_id)
+        if guild_states is not None:
+            guild_states.pop(member_id, None)
+
+    def forget_guild(self, guild_id: int):
+        self.states.pop(guild_id, None)
@@ -1,5 +1,7 @@
 import re
 
+from bisect import bisect_left
+
 
 class LogRequestMatcher:
     RE_AUTOLOG = [
@@ -7,8 +9,60 @@ class LogRequestMatcher:
         r"^.*(where)[a-zA-Z0-9\s,]{1,32}\blogs?\b.*$",
         r"^.*(what)[a-zA-Z0-9\s,]{1,16}\blogs?\b.*(say).*$",
     ]
+    # The same patterns split at the keyword: the words before it, the most
+    # characters between those words and the keyword, and what has to follow
+    # the keyword. Only the few characters between a word and a keyword are
+    # matched against a pattern, so matching takes linear time however long
+    # a message is.
+    RULES = [
+        (r"send|share|show|need", 16, None),
+        (r"where", 32, None),
+        (r"what", 16, r"say"),
+    ]
+    KEYWORD = re.compile(r"\blogs?\b", re.IGNORECASE)
+
+    def __init__(self):
+        self.rules = [
+            (
+                re.compile(words, re.IGNORECASE),
+                gap + max(map(len, words.split("|"))),
+                re.compile(rf"[a-zA-Z0-9\s,]{{1,{gap}}}", re.IGNORECASE),
+                re.compile(after, re.IGNORECASE) if after else None,
+            )
+            for words, gap, after in self.RULES
+        ]
 
     def test(self, message: str) -> bool:
-        return any(
-            re.compile(regex, re.IGNORECASE).match(message) for regex in self.RE_AUTOLOG
-        )
+        # Like the patterns, the words have to be on the first line (^.*)
+        # and the keyword on the last one (.*$, which allows a final "\n").
+        first_line_end = message.find("\n")
+        if first_line_end < 0:
+            first_line_end = len(message)
+        end = len(message) - message.endswith("\n")
+        last_line_start = message.rfind("\n", 0, end) + 1
+
+        keywords = list(self.KEYWORD.finditer(message, last_line_start, end))
+        if not keywords:
+            return False
+
+        for words, window, run, after in self.rules:
+            if after is not None:
+                # has to follow the keyword on the same line
+                after_start = max(
+                    (m.start() for m in after.finditer(message, last_line_start, end)),
+                    default=-1,
+                )
+            # None of the words overlap, so all of them are found
+            found = [m.span() for m in words.finditer(message, 0, first_line_end)]
+            if not found:
+                continue
+            for keyword in keywords:
+                if after is not None and after_start < keyword.end():
+                    break
+                start = keyword.start()
+                i = bisect_left(found, (start - window, 0))
+                while i < len(found) and found[i][1] < start:
+                    if run.fullmatch(message, found[i][1], start):
+                        return True
+                    i += 1
+        return False
@@ -0,0 +1,49 @@
+from collections import OrderedDict
+from time import monotonic
+
+
+class ReplyThrottle:
+    """
+    Remembers when the bot last replied in a channel, or to a user in a
+    channel, and suppresses further replies there until the cooldown has
+    passed. At most max_entries replies are remembered; the oldest are
+    forgotten first.
+    """
+
+    def __init__(self, cooldown: float, max_entries: int, per_user: bool = False):
+        self.cooldown = cooldown
+        self.max_entries = max_entries
+        self.per_user = per_user
+        # channel id or (channel id, user id) -> time of the last reply,
+        # oldest first
+        self.replies: OrderedDict[int | tuple[int, int], float] = OrderedDict()
+        self.suppressed = 0
+
+    def __len__(self) -> int:
+        return len(self.replies)
+
+    def allow(self, channel_id: int, user_id: int, now: float | None = None) -> bool:
+        """
+        Returns whether a reply may be sent and, if so, starts the cooldown.
+        """
+        if now is None:
+            now = monotonic()
+        key = (channel_id, user_id) if self.per_user else channel_id
+        last_reply = self.replies.get(key)
+        if last_reply is not None and now - last_reply < self.cooldown:
+            self.suppressed += 1
+            return False
+
+        self.replies[key] = now
+        self.replies.move_to_end(key)
+        # Replies are ordered by time, so the expired ones come first
+        while self.replies:
+            oldest_key, oldest_reply = next(iter(self.replies.items()))
+            expired = now - oldest_reply >= self.cooldown
+            if not expired and len(self.replies) <= self.max_entries:
+                break
+            del self.replies[oldest_key]
+        return True
+
+    def stats(self) -> str:
+        return f"{len(self.replies)} cooling down, {self.suppressed} suppressed"
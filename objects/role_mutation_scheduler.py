@@ -0,0 +1,180 @@
+import asyncio
+import itertools
+import discord
+
+from collections.abc import Awaitable, Callable
+from time import monotonic
+from typing import Any
+
+from enums import MutationPriority
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = monotonic()
+
+    def delay(self) -> float:
+        """
+        Returns how many seconds to wait until a token can be taken.
+        """
+        now = monotonic()
+        if now > self.updated:
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+        delay = max(0.0, self.updated - now)
+        if self.tokens < 1:
+            delay += (1 - self.tokens) / self.rate
+        return delay
+
+    def take(self):
+        self.tokens -= 1
+
+    def pause(self, seconds: float):
+        # A single token once the given time has passed
+        self.tokens = min(self.tokens, 1.0)
+        self.updated = max(self.updated, monotonic() + seconds)
+
+
+class RoleMutationScheduler:
+    """
+    Runs role changes one after another per guild, highest priority first,
+    limited by a token bucket per guild. Requests that are rate limited
+    are retried with exponential backoff.
+
+    discord.py already sleeps through 429 responses and retries a request up
+    to five times on its own, so a mutation only fails with a 429 once it
+    gave up, or with discord.RateLimited when the client has a
+    max_ratelimit_timeout. Both pause the guild's bucket before the retry,
+    so the rest of the guild's queue waits as well instead of running into
+    the same limit.
+    """
+
+    BACKOFF_BASE = 0.5
+    BACKOFF_MAX = 60.0
+
+    def __init__(self, rate: float, burst: int, max_retries: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.queues: dict[int, asyncio.PriorityQueue] = {}
+        self.buckets: dict[int, TokenBucket] = {}
+        self.workers: dict[int, asyncio.Task] = {}
+        self.sequence = itertools.count()
+        self.completed = 0
+        self.rate_limited = 0
+        self.failed = 0
+
+    @property
+    def backlog(self) -> int:
+        return sum(queue.qsize() for queue in self.queues.values())
+
+    def backlog_by_guild(self) -> dict[int, int]:
+        return {
+            guild_id: queue.qsize()
+            for guild_id, queue in self.queues.items()
+            if queue.qsize() > 0
+        }
+
+    def stats(self) -> str:
+        return (
+            f"backlog {self.backlog}, {self.completed} completed, "
+            f"{self.rate_limited} rate limited, {self.failed} failed"
+        )
+
+    async def submit(
+        self,
+        guild_id: int,
+        priority: MutationPriority,
+        mutation: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        return await self.enqueue(guild_id, priority, mutation)
+
+    def enqueue(
+        self,
+        guild_id: int,
+        priority: MutationPriority,
+        mutation: Callable[[], Awaitable[Any]],
+    ) -> asyncio.Future:
+        """
+        Queues a mutation without waiting for it. The returned future
+        completes with its result once it ran.
+        """
+        future = asyncio.get_running_loop().create_future()
+        if guild_id not in self.queues:
+            self.queues[guild_id] = asyncio.PriorityQueue()
+            self.buckets[guild_id] = TokenBucket(self.rate, self.burst)
+        if guild_id not in self.workers or self.workers[guild_id].done():
+            self.workers[guild_id] = asyncio.create_task(self._work(guild_id))
+
+        self.queues[guild_id].put_nowait(
+            (priority, next(self.sequence), 0, mutation, future)
+        )
+        return future
+
+    async def close(self):
+        for worker in self.workers.values():
+            worker.cancel()
+        await asyncio.gather(*self.workers.values(), return_exceptions=True)
+        self.workers.clear()
+
+    def retry_delay(
+        self, error: discord.HTTPException | discord.RateLimited, attempt: int
+    ) -> float:
+        delay = self.BACKOFF_BASE * 2**attempt
+        if isinstance(error, discord.RateLimited):
+            retry_after = error.retry_after
+        else:
+            retry_after = error.response.headers.get("Retry-After")
+        if retry_after is not None:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        return min(delay, self.BACKOFF_MAX)
+
+    async def _work(self, guild_id: int):
+        queue = self.queues[guild_id]
+        bucket = self.buckets[guild_id]
+        while True:
+            item = await queue.get()
+            priority, sequence, attempt, mutation, future = item
+            try:
+                if future.done():
+                    # the caller is not waiting for it anymore
+                    continue
+                delay = bucket.delay()
+                if delay > 0:
+                    # Put it back, something more important might come
+                    # in while waiting
+                    queue.put_nowait(item)
+                    await asyncio.sleep(delay)
+                    continue
+                bucket.take()
+                result = await mutation()
+            except (discord.HTTPException, discord.RateLimited) as e:
+                rate_limited = isinstance(e, discord.RateLimited) or e.status == 429
+                if rate_limited and attempt < self.max_retries:
+                    self.rate_limited += 1
+                    bucket.pause(self.retry_delay(e, attempt))
+                    # Keeps its place, so the retry still runs before
+                    # anything with a lower priority
+                    queue.put_nowait((priority, sequence, attempt + 1, mutation, future))
+                else:
+                    self.failed += 1
+                    if not future.done():
+                        future.set_exception(e)
+            except Exception as e:
+                self.failed += 1
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                self.completed += 1
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                queue.task_done()
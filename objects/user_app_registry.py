@@ -0,0 +1,93 @@
+import heapq
+
+
+class UserAppRegistry:
+    """
+    The custom app IDs users registered, with the time each one was last
+    seen. Next to the apps per user it keeps the users per app and a heap
+    of (timestamp, user id, app id), so expired and promoted apps are found
+    without looking at every user.
+
+    Heap entries are not removed when a timestamp changes or an app is
+    removed. Outdated entries are skipped when they come up and dropped
+    when the heap grows too large.
+    """
+
+    def __init__(self):
+        # user id -> {app id -> last seen timestamp}
+        self.apps: dict[int, dict[int, int]] = {}
+        # app id -> user ids
+        self.users: dict[int, set[int]] = {}
+        self.expiry: list[tuple[int, int, int]] = []
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def get(self, user_id: int) -> dict[int, int] | None:
+        return self.apps.get(user_id)
+
+    def users_of(self, app_id: int) -> set[int]:
+        return self.users.get(app_id, set())
+
+    def app_ids(self) -> set[int]:
+        return set(self.users)
+
+    def add(self, user_id: int, app_id: int, timestamp: int):
+        timestamps = self.apps.setdefault(user_id, {})
+        if app_id not in timestamps:
+            self.users.setdefault(app_id, set()).add(user_id)
+            self.size += 1
+        timestamps[app_id] = timestamp
+        self._push(timestamp, user_id, app_id)
+
+    def touch(self, user_id: int, app_id: int, timestamp: int):
+        self.apps[user_id][app_id] = timestamp
+        self._push(timestamp, user_id, app_id)
+
+    def remove(self, user_id: int, app_id: int):
+        timestamps = self.apps.get(user_id)
+        if timestamps is None or app_id not in timestamps:
+            return
+
+        del timestamps[app_id]
+        if not timestamps:
+            del self.apps[user_id]
+        users = self.users[app_id]
+        users.discard(user_id)
+        if not users:
+            del self.users[app_id]
+        self.size -= 1
+
+    def remove_user(self, user_id: int):
+        for app_id in list(self.apps.get(user_id, ())):
+            self.remove(user_id, app_id)
+
+    def remove_app(self, app_id: int) -> set[int]:
+        users = set(self.users_of(app_id))
+        for user_id in users:
+            self.remove(user_id, app_id)
+        return users
+
+    def expire(self, before: int) -> list[tuple[int, int]]:
+        """
+        Removes all apps last seen before the given timestamp
+        and returns them as (user id, app id).
+        """
+        expired = []
+        while self.expiry and self.expiry[0][0] < before:
+            timestamp, user_id, app_id = heapq.heappop(self.expiry)
+            if self.apps.get(user_id, {}).get(app_id) == timestamp:
+                self.remove(user_id, app_id)
+                expired.append((user_id, app_id))
+        return expired
+
+    def _push(self, timestamp: int, user_id: int, app_id: int):
+        heapq.heappush(self.expiry, (timestamp, user_id, app_id))
+        if len(self.expiry) > 2 * self.size + 64:
+            self.expiry = [
+                (timestamp, user_id, app_id)
+                for user_id, timestamps in self.apps.items()
+                for app_id, timestamp in timestamps.items()
+            ]
+            heapq.heapify(self.expiry)
@@ -0,0 +1,56 @@
+import pytest
+
+from aiohttp import web
+from contextlib import asynccontextmanager
+
+import utils
+
+from utils.init_database import load_macros_database, load_settings_database
+
+
+@pytest.fixture
+def settings(tmp_path, monkeypatch):
+    # Settings files are created in the working directory
+    monkeypatch.chdir(tmp_path)
+    settings = load_settings_database()
+    yield settings
+    settings.close()
+
+
+@pytest.fixture
+def make_bot_utils(settings):
+    def make_bot_utils(client=None) -> utils.BotUtils:
+        return utils.BotUtils(
+            client, load_macros_database(":memory:"), settings, None
+        )
+
+    return make_bot_utils
+
+
+@pytest.fixture
+def bot_utils(make_bot_utils) -> utils.BotUtils:
+    return make_bot_utils()
+
+
+@pytest.fixture
+def serve():
+    """
+    Serves a single route on a local port for as long as the returned
+    context is entered and yields its URL.
+    """
+
+    @asynccontextmanager
+    async def serve(method: str, path: str, handler):
+        app = web.Application()
+        app.router.add_route(method, path, handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        try:
+            site = web.TCPSite(runner, "127.0.0.1", 0)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]
+            yield f"http://127.0.0.1:{port}{path}"
+        finally:
+            await runner.cleanup()
+
+    return serve
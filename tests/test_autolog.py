@@ -0,0 +1,113 @@
+import asyncio
+import enums
+
+from types import SimpleNamespace
+
+
+def make_message(guild_id, channel_id, content, author_id=5):
+    replies = []
+
+    async def reply(text):
+        replies.append(text)
+
+    message = SimpleNamespace(
+        author=SimpleNamespace(id=author_id),
+        guild=SimpleNamespace(id=guild_id) if guild_id is not None else None,
+        channel=SimpleNamespace(id=channel_id),
+        content=content,
+        reply=reply,
+    )
+    return message, replies
+
+
+def test_observed_channels_follow_autolog_command(settings, make_bot_utils):
+    settings.ladd(enums.SettingsKeys.AUTOLOG, "1:2")
+    bot_utils = make_bot_utils()
+    assert bot_utils.observed_channels == {(1, 2)}
+
+    channel = SimpleNamespace(id=3, guild=SimpleNamespace(id=1))
+    bot_utils.autolog_command(channel, enums.AutologState.ON)
+    assert bot_utils.observed_channels == {(1, 2), (1, 3)}
+    assert settings.lexists(enums.SettingsKeys.AUTOLOG, "1:3")
+
+    bot_utils.autolog_command(
+        SimpleNamespace(id=2, guild=SimpleNamespace(id=1)), enums.AutologState.OFF
+    )
+    assert bot_utils.observed_channels == {(1, 3)}
+    assert not settings.lexists(enums.SettingsKeys.AUTOLOG, "1:2")
+
+    observed, observed_replies = make_message(1, 3, "can you send me the logs")
+    unobserved, unobserved_replies = make_message(1, 2, "can you send me the logs")
+    direct, direct_replies = make_message(None, 3, "can you send me the logs")
+    for message in (observed, unobserved, direct):
+        asyncio.run(bot_utils.autolog(message))
+    assert len(observed_replies) == 1
+    assert unobserved_replies == direct_replies == []
+
+    bot_utils.autolog_command(None, enums.AutologState.OFF)
+    assert bot_utils.observed_channels == set()
+    assert settings.get(enums.SettingsKeys.AUTOLOG) == []
+
+
+def test_autolog_replies_once_per_cooldown(settings, make_bot_utils):
+    settings.ladd(enums.SettingsKeys.AUTOLOG, "1:2")
+    bot_utils = make_bot_utils()
+
+    replies = []
+    for author_id in (5, 6, 7):
+        message, author_replies = make_message(1, 2, "where are the logs", author_id)
+        asyncio.run(bot_utils.autolog(message))
+        replies += author_replies
+    assert len(replies) == 1
+    assert bot_utils.autolog_throttle.suppressed == 2
+
+
+def test_autolog_uses_guild_patterns(settings, make_bot_utils):
+    settings.ladd(enums.SettingsKeys.AUTOLOG, "1:2")
+    settings.ladd(enums.SettingsKeys.AUTOLOG, "3:4")
+    bot_utils = make_bot_utils()
+
+    assert "invalid" in bot_utils.add_autolog_pattern(1, "(")
+    assert bot_utils.add_autolog_pattern(1, r"envoie.{0,20}journaux").startswith("Added")
+    assert "already" in bot_utils.add_autolog_pattern(1, r"envoie.{0,20}journaux")
+    matcher = bot_utils.autolog_matchers.get(1)
+    assert matcher is not None
+
+    def replies_to(guild_id, channel_id, content):
+        bot_utils.autolog_throttle.replies.clear()
+        message, replies = make_message(guild_id, channel_id, content)
+        asyncio.run(bot_utils.autolog(message))
+        return bool(replies)
+
+    assert replies_to(1, 2, "Tu peux m'envoie tes JOURNAUX ?")
+    assert not replies_to(3, 4, "Tu peux m'envoie tes journaux ?")
+    assert replies_to(3, 4, "can you send me the logs")
+    # only the first characters of a message are matched
+    assert not replies_to(1, 2, "x" * 5000 + "envoie journaux")
+
+    # compiled once, kept until the patterns of the guild change
+    assert replies_to(1, 2, "envoie les journaux")
+    assert bot_utils.autolog_matchers.get(1) is matcher
+    bot_utils.add_autolog_pattern(1, "gib logz")
+    assert bot_utils.autolog_matchers.get(1) is not matcher
+    assert replies_to(1, 2, "gib logz pls")
+
+    # evicted matchers are compiled again on use
+    bot_utils.autolog_matchers.invalidate(1)
+    assert replies_to(1, 2, "gib logz pls")
+
+    # the patterns are stored in the settings
+    reloaded = make_bot_utils()
+    assert reloaded.autolog_patterns[1] == (r"envoie.{0,20}journaux", "gib logz")
+    assert reloaded.autolog_matchers.get(1) is not None
+
+    bot_utils.remove_autolog_pattern(1, r"envoie.{0,20}journaux")
+    bot_utils.remove_autolog_pattern(1, "gib logz")
+    assert bot_utils.autolog_matchers.get(1) is None
+    assert not settings.dexists(enums.SettingsKeys.AUTOLOG_PATTERNS, "1")
+    assert not replies_to(1, 2, "gib logz pls")
+
+
+def test_autolog_rejects_patterns_re2_cannot_run(bot_utils):
+    assert "invalid" in bot_utils.add_autolog_pattern(1, r"(logs?)\s+\1")
+    assert bot_utils.autolog_patterns == {}
@@ -0,0 +1,39 @@
+import pytest
+
+from time import perf_counter
+
+from objects import (
+    AutologPatternCache,
+    AutologPatternMatcher,
+    InvalidAutologPattern,
+    compile_autolog_pattern,
+)
+
+
+def test_autolog_pattern_cache_is_bounded():
+    cache = AutologPatternCache(max_entries=2)
+    for guild_id in range(3):
+        cache.put(guild_id, AutologPatternMatcher(("logs",), 100))
+    assert cache.get(0) is None
+    assert cache.get(1) is not None
+    # 1 was used more recently than 2
+    cache.put(3, AutologPatternMatcher(("logs",), 100))
+    assert cache.get(2) is None
+    assert cache.get(1) is not None
+    assert len(cache) == 2
+
+
+def test_autolog_patterns_match_in_linear_time():
+    # takes Python's re seconds on 25 characters, and doubles with each one
+    matcher = AutologPatternMatcher((r"(a+)+$", r"(\w|\d)*x"), 2000)
+    start = perf_counter()
+    assert not matcher.test("a" * 1000 + "!")
+    assert not matcher.test("1" * 1000 + "!")
+    assert perf_counter() - start < 0.1
+    assert matcher.test("1" * 10 + "X")
+
+    for pattern in (r"(a)\1", r"(?=logs)", "("):
+        with pytest.raises(InvalidAutologPattern):
+            compile_autolog_pattern(pattern)
+    # stored before patterns were checked
+    assert AutologPatternMatcher((r"(?<=send )logs", "logs"), 1000).test("logs")
@@ -0,0 +1,59 @@
+import asyncio
+
+from objects import CoalescingQueue
+
+
+def test_coalescing_queue_handles_latest_value():
+    handled = []
+
+    async def handler(value):
+        handled.append(value)
+
+    async def run():
+        queue = CoalescingQueue(handler, workers=2)
+        for i in range(5):
+            queue.put("a", i)
+        queue.put("b", 0)
+        assert queue.depth == 2
+
+        queue.start()
+        await queue.join()
+        await queue.stop()
+        return queue
+
+    queue = asyncio.run(run())
+    assert sorted(handled) == [0, 4]
+    assert queue.enqueued == 6
+    assert queue.coalesced == 4
+    assert queue.coalesce_ratio == 4 / 6
+    assert queue.depth == 0
+
+
+def test_coalescing_queue_reruns_key_updated_while_running():
+    handled = []
+    running = 0
+    max_running = 0
+
+    async def run():
+        queue = None
+
+        async def handler(value):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            if value == 0:
+                queue.put("a", 1)
+                queue.put("a", 2)
+            await asyncio.sleep(0.01)
+            handled.append(value)
+            running -= 1
+
+        queue = CoalescingQueue(handler, workers=4)
+        queue.start()
+        queue.put("a", 0)
+        await queue.join()
+        await queue.stop()
+
+    asyncio.run(run())
+    assert handled == [0, 2]
+    assert max_running == 1
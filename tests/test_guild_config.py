@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+import enums
+
+from utils.init_database import load_settings_database
+
+
+def test_guild_config_parses_and_writes_settings(settings, make_bot_utils):
+    settings.dadd(enums.SettingsKeys.ROLES, ("1", {"2": 3}))
+    settings.dadd(enums.SettingsKeys.SPONSOR_ROLES, ("1", {"monthly": 4}))
+    settings.dadd(enums.SettingsKeys.SPONSOR_PLATFORMS, ("1", {"kofi": "☕"}))
+    settings.dadd(enums.SettingsKeys.SPONSOR_PLATFORM_ROLES, ("1", {"5": "kofi"}))
+
+    bot_utils = make_bot_utils()
+    config = bot_utils.get_guild_config(1)
+    assert config.listener_roles == {2: 3}
+    assert config.sponsor_monthly_role_id == 4
+    assert config.sponsor_platforms["kofi"].emoji == "☕"
+    assert config.sponsor_platform_roles == {5: "kofi"}
+    assert bot_utils.get_guild_config(2).listener_roles is None
+
+    guild = SimpleNamespace(id=1, get_role=lambda role_id: True)
+    bot_utils.edit_sponsor_platform(
+        guild, "kofi", url="https://ko-fi.com", role=SimpleNamespace(id=6)
+    )
+    bot_utils.add_sponsor_platform(guild, "patreon", "🎁", SimpleNamespace(id=7))
+    bot_utils.set_sponsor_roles(guild, normal_role=SimpleNamespace(id=8))
+    assert not bot_utils.delete_sponsor_platform(guild, "missing")
+    assert bot_utils.get_platform_overview(guild) == (
+        "- ☕ `kofi` ([link](https://ko-fi.com)) -> <@&6>\n- 🎁 `patreon` -> <@&7>"
+    )
+
+    settings.close()
+    settings = load_settings_database()
+    assert settings.dget(enums.SettingsKeys.SPONSOR_PLATFORMS, "1")["kofi"] == {
+        "emoji": "☕",
+        "url": "https://ko-fi.com",
+    }
+    assert settings.dget(enums.SettingsKeys.SPONSOR_PLATFORM_ROLES, "1") == {
+        "6": "kofi",
+        "7": "patreon",
+    }
+    assert settings.dget(enums.SettingsKeys.SPONSOR_ROLES, "1") == {
+        "monthly": 4,
+        "normal": 8,
+    }
+    settings.close()
@@ -0,0 +1,35 @@
+import asyncio
+import pytest
+
+from aiohttp import web
+
+from utils.http_client import HttpClient, ResponseTooLarge
+
+
+def test_http_client_reuses_connections_and_counts_errors(serve):
+    peers = []
+
+    async def handle(request: web.Request):
+        peers.append(request.transport.get_extra_info("peername"))
+        size = int(request.query.get("size", 2))
+        return web.Response(body=b"x" * size, status=int(request.query.get("status", 200)))
+
+    async def run():
+        async with (
+            serve("GET", "/", handle) as url,
+            HttpClient(max_response_size=100) as http,
+        ):
+            first = await http.get(url)
+            second = await http.get(url + "?status=503")
+            with pytest.raises(ResponseTooLarge):
+                await http.get(url + "?size=1000")
+            stats = http.upstreams[url.split("/")[2]]
+        return first, second, stats
+
+    first, second, stats = asyncio.run(run())
+    assert first.status == 200 and first.body == b"xx"
+    assert second.status == 503
+    assert peers[0] == peers[1]
+    assert stats.requests == 3
+    assert stats.errors == 2
+    assert stats.max_latency > 0
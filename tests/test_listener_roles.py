@@ -0,0 +1,314 @@
+import asyncio
+import discord
+
+from types import SimpleNamespace
+
+import enums
+import utils
+
+from enums.constants import MUSIC_APP_ID, PRESENCE_WORKERS
+from objects import RoleMutationScheduler
+
+
+class FakeRole(SimpleNamespace):
+    # hashable like discord.Role
+    __hash__ = object.__hash__
+
+
+def make_guild(guild_id: int, role_ids: list[int]):
+    guild = SimpleNamespace(id=guild_id, roles={})
+    guild.get_role = guild.roles.get
+    for role_id in role_ids:
+        guild.roles[role_id] = FakeRole(id=role_id, guild=guild, members=[])
+    return guild
+
+
+def make_member(guild, roles, status=discord.Status.online, app_ids=()):
+    activities = [discord.Game("Some game")] + [
+        discord.Activity(
+            name="Music", type=discord.ActivityType.listening, application_id=app_id
+        )
+        for app_id in app_ids
+    ]
+    member = SimpleNamespace(
+        id=100, guild=guild, roles=roles, status=status, activities=activities
+    )
+    member.calls = []
+
+    async def add_roles(*roles):
+        member.calls.append(("add", [role.id for role in roles]))
+        member.roles = member.roles + list(roles)
+
+    async def remove_roles(*roles):
+        member.calls.append(("remove", [role.id for role in roles]))
+        member.roles = [role for role in member.roles if role not in roles]
+
+    member.add_roles = add_roles
+    member.remove_roles = remove_roles
+    return member
+
+
+async def check(bot_utils: utils.BotUtils, member):
+    change = await bot_utils.check_member(member)
+    if change is not None:
+        await change
+
+
+def test_listener_role_index_follows_changes(settings, bot_utils):
+    # listener role 21 was deleted while the bot was offline
+    settings.dadd(enums.SettingsKeys.ROLES, ("1", {"10": 20, "11": 21}))
+    guild = make_guild(1, [10, 11, 12, 20, 22])
+    roles = guild.roles
+
+    # not available yet
+    assert bot_utils.get_role_listener(guild, roles[10]) is None
+
+    bot_utils.index_listener_roles(guild)
+    assert bot_utils.listener_roles[1] == {10: roles[20]}
+    assert settings.dget(enums.SettingsKeys.ROLES, "1") == {"10": 20}
+
+    bot_utils.set_role_listener(guild, roles[12], roles[22])
+    assert bot_utils.get_role_listener(guild, roles[12]) is roles[22]
+    bot_utils.set_role_listener(guild, roles[10], None)
+    assert bot_utils.listener_roles[1] == {12: roles[22]}
+    assert settings.dget(enums.SettingsKeys.ROLES, "1") == {"12": 22}
+
+    # a deleted listener role
+    bot_utils.set_role_listener(guild, roles[10], roles[20])
+    deleted = roles.pop(20)
+    bot_utils.remove_deleted_role(deleted)
+    assert bot_utils.listener_roles[1] == {12: roles[22]}
+    assert settings.dget(enums.SettingsKeys.ROLES, "1") == {"12": 22}
+
+    # a deleted role the listener role is given for
+    deleted = roles.pop(12)
+    bot_utils.remove_deleted_role(deleted)
+    assert bot_utils.listener_roles[1] == {}
+    assert settings.dget(enums.SettingsKeys.ROLES, "1") == {}
+
+    bot_utils.set_role_listener(guild, roles[10], roles[22])
+    bot_utils.reset_listener_roles(guild)
+    assert 1 not in bot_utils.listener_roles
+    assert not settings.dexists(enums.SettingsKeys.ROLES, "1")
+
+
+def test_listener_changes_are_detected(bot_utils):
+    bot_utils.known_app_ids = frozenset({MUSIC_APP_ID})
+    bot_utils.user_apps.add(100, 7, 0)
+    guild = make_guild(1, [1, 10, 20])
+    roles = guild.roles
+    listening = make_member(guild, [roles[1]], app_ids=[MUSIC_APP_ID])
+
+    # no listener roles configured in the guild
+    stopped = make_member(guild, [roles[1]])
+    assert not bot_utils.is_listener_change(listening, stopped)
+
+    bot_utils.listener_roles[1] = {10: roles[20]}
+    # never checked yet
+    assert bot_utils.is_listener_change(
+        listening, make_member(guild, [roles[1]], app_ids=[MUSIC_APP_ID])
+    )
+    bot_utils.listener_states.set(1, 100, frozenset())
+    # a track change within the same activity
+    assert not bot_utils.is_listener_change(
+        listening, make_member(guild, [roles[1]], app_ids=[MUSIC_APP_ID])
+    )
+    assert bot_utils.is_listener_change(listening, stopped)
+    assert bot_utils.is_listener_change(
+        listening, make_member(guild, [roles[1]], app_ids=[MUSIC_APP_ID, 7])
+    )
+    # apps nobody registered don't matter
+    assert not bot_utils.is_listener_change(
+        listening, make_member(guild, [roles[1]], app_ids=[MUSIC_APP_ID, 8])
+    )
+    assert bot_utils.is_listener_change(
+        listening,
+        make_member(
+            guild, [roles[1]], status=discord.Status.offline, app_ids=[MUSIC_APP_ID]
+        ),
+    )
+    assert not bot_utils.is_listener_change(
+        listening,
+        make_member(
+            guild, [roles[1]], status=discord.Status.idle, app_ids=[MUSIC_APP_ID]
+        ),
+    )
+
+    # gaining the role the listener role is given for
+    with_role = make_member(guild, [roles[1], roles[10]], app_ids=[MUSIC_APP_ID])
+    assert bot_utils.is_for_role_change(listening, with_role)
+    assert bot_utils.is_for_role_change(with_role, listening)
+    # other role changes, e.g. the listener role itself
+    assert not bot_utils.is_for_role_change(
+        with_role,
+        make_member(guild, [roles[1], roles[10], roles[20]], app_ids=[MUSIC_APP_ID]),
+    )
+
+
+def test_check_member_only_changes_listener_roles(bot_utils):
+    bot_utils.known_app_ids = frozenset({MUSIC_APP_ID})
+    guild = make_guild(1, [1, 10, 11, 20, 21, 30])
+    roles = guild.roles
+    bot_utils.listener_roles[1] = {10: roles[20], 11: roles[21]}
+    # moved from the tier of role 11 to the one of role 10
+    member = make_member(guild, [roles[1], roles[10], roles[21]], app_ids=[MUSIC_APP_ID])
+
+    async def run():
+        await check(bot_utils, member)
+        # a role someone else gave the member is kept
+        member.roles = member.roles + [roles[30]]
+        await check(bot_utils, member)
+        member.status = discord.Status.offline
+        await check(bot_utils, member)
+        await check(bot_utils, member)
+        await bot_utils.role_scheduler.close()
+
+    asyncio.run(run())
+    assert member.calls == [("remove", [21]), ("add", [20]), ("remove", [20])]
+    assert [role.id for role in member.roles] == [1, 10, 30]
+
+
+def test_listener_role_removed_by_hand_is_restored(bot_utils):
+    bot_utils.known_app_ids = frozenset({MUSIC_APP_ID})
+    guild = make_guild(1, [1, 10, 20])
+    roles = guild.roles
+    bot_utils.listener_roles[1] = {10: roles[20]}
+    member = make_member(guild, [roles[1], roles[10]], app_ids=[MUSIC_APP_ID])
+    add_roles = member.add_roles
+
+    async def fail_once(*roles):
+        member.add_roles = add_roles
+        raise discord.DiscordException("Missing Permissions")
+
+    def copy(member):
+        return SimpleNamespace(**vars(member))
+
+    async def updated():
+        await bot_utils.presence_queue.join()
+        await asyncio.sleep(0)  # the change completes after the check
+
+    async def run():
+        bot_utils.presence_queue.start()
+        # only the track changes
+        member.add_roles = fail_once
+        bot_utils.queue_presence_update(copy(member), member)
+        await updated()
+        assert member.calls == []
+        bot_utils.queue_presence_update(copy(member), member)
+        await updated()
+        assert member.calls == [("add", [20])]
+
+        # no member update for the change ever arrives,
+        # then a moderator removes the listener role
+        before = copy(member)
+        member.roles = [roles[1], roles[10]]
+        bot_utils.queue_member_update(before, member)
+        await updated()
+        bot_utils.queue_presence_update(copy(member), member)
+        await updated()
+        await bot_utils.presence_queue.stop()
+        await bot_utils.role_scheduler.close()
+
+    asyncio.run(run())
+    assert member.calls == [("add", [20]), ("add", [20])]
+
+
+def test_busy_guild_does_not_hold_up_presence_workers(bot_utils):
+    bot_utils.known_app_ids = frozenset({MUSIC_APP_ID})
+    # a single change per guild every 10 seconds
+    bot_utils.role_scheduler = RoleMutationScheduler(rate=0.1, burst=1, max_retries=0)
+    busy, other = make_guild(1, [1, 10, 20]), make_guild(2, [1, 10, 20])
+    for guild in (busy, other):
+        bot_utils.listener_roles[guild.id] = {10: guild.roles[20]}
+    busy_members = []
+    for member_id in range(PRESENCE_WORKERS * 2):
+        member = make_member(
+            busy, [busy.roles[1], busy.roles[10]], app_ids=[MUSIC_APP_ID]
+        )
+        member.id = member_id
+        busy_members.append(member)
+    member = make_member(
+        other, [other.roles[1], other.roles[10]], app_ids=[MUSIC_APP_ID]
+    )
+
+    async def run():
+        bot_utils.presence_queue.start()
+        for busy_member in busy_members:
+            bot_utils.presence_queue.put((1, busy_member.id), busy_member)
+        bot_utils.presence_queue.put((2, member.id), member)
+        await asyncio.wait_for(bot_utils.presence_queue.join(), 1)
+        while not member.calls:
+            await asyncio.sleep(0.01)
+        backlog = bot_utils.role_scheduler.backlog_by_guild()
+        await bot_utils.presence_queue.stop()
+        await bot_utils.role_scheduler.close()
+        return backlog
+
+    backlog = asyncio.run(asyncio.wait_for(run(), 2))
+    assert member.calls == [("add", [20])]
+    assert backlog == {1: len(busy_members) - 1}
+
+
+def test_sweep_candidates_are_members_with_configured_roles(bot_utils):
+    guild = make_guild(1, [1, 10, 11, 20, 21])
+    roles = guild.roles
+    members = {}
+    for member_id, role_ids in ((1, [10]), (2, [11, 20]), (3, [21]), (4, [])):
+        member = SimpleNamespace(id=member_id)
+        members[member_id] = member
+        for role_id in role_ids:
+            roles[role_id].members.append(member)
+    # everyone has the default role
+    roles[1].members = list(members.values())
+    guild.members = list(members.values())
+
+    # not indexed yet, e.g. the guild is not available
+    assert bot_utils.get_sweep_candidates(guild) == guild.members
+
+    # role 12 is gone, but members can still have its listener role
+    bot_utils.listener_roles[1] = {10: roles[20], 11: roles[20], 12: roles[21]}
+    candidates = bot_utils.get_sweep_candidates(guild)
+    assert sorted(member.id for member in candidates) == [1, 2, 3]
+
+    # the sweep goes by the index only, never the raw settings
+    swept = []
+
+    async def sweep_member(member):
+        swept.append(member.id)
+
+    def dexists(*args):
+        raise AssertionError("the sweep read the settings")
+
+    bot_utils.sweep_member = sweep_member
+    bot_utils.settings.dexists = dexists
+    guild.name, guild.member_count = "Guild", len(guild.members)
+    asyncio.run(bot_utils.check_guild(guild))
+    assert sorted(swept) == [1, 2, 3]
+    del bot_utils.listener_roles[1]
+    asyncio.run(bot_utils.check_guild(guild))
+    assert sorted(swept) == [1, 2, 3]
+    del bot_utils.settings.dexists
+
+
+def test_listener_roles_are_removed_from_all_in_time(bot_utils):
+    guild = make_guild(1, [1, 10, 20])
+    roles = guild.roles
+    bot_utils.listener_roles[1] = {10: roles[20]}
+    guild.members = []
+    for member_id in range(12):
+        member = make_member(guild, [roles[1], roles[10], roles[20]])
+        member.id = member_id
+        guild.members.append(member)
+
+    async def run():
+        # the first response to an interaction has to be sent within 3 seconds,
+        # the command defers it but shouldn't need to
+        start = asyncio.get_running_loop().time()
+        await bot_utils.remove_all_listener_roles_from_all(guild)
+        duration = asyncio.get_running_loop().time() - start
+        await bot_utils.role_scheduler.close()
+        return duration
+
+    assert asyncio.run(run()) < 3
+    for member in guild.members:
+        assert member.calls == [("remove", [20])]
@@ -0,0 +1,37 @@
+from objects import ListenerStateCache
+
+
+def test_listener_state_cache_keeps_pending_state_until_observed():
+    cache = ListenerStateCache()
+    cache.set(1, 10, frozenset({100}), pending=True)
+
+    # a member update from before the change was applied
+    assert not cache.reconcile(1, 10, frozenset())
+    assert cache.get(1, 10) == frozenset({100})
+    assert cache.is_pending(1, 10)
+
+    cache.reconcile(1, 10, frozenset({100}))
+    assert cache.get(1, 10) == frozenset({100})
+    assert not cache.is_pending(1, 10)
+
+    # removed by someone else after it was applied
+    assert cache.reconcile(1, 10, frozenset())
+    assert cache.get(1, 10) == frozenset()
+    assert not cache.reconcile(1, 10, frozenset())
+
+    cache.forget_guild(1)
+    assert cache.get(1, 10) is None
+
+
+def test_listener_state_cache_confirms_applied_changes():
+    cache = ListenerStateCache()
+    cache.set(1, 10, frozenset({100}), pending=True)
+    cache.confirm(1, 10, frozenset({101}))
+    assert cache.is_pending(1, 10)
+
+    # the request succeeded, but no member update came
+    cache.confirm(1, 10, frozenset({100}))
+    assert not cache.is_pending(1, 10)
+    # so the role being removed by someone else is noticed
+    cache.reconcile(1, 10, frozenset())
+    assert cache.get(1, 10) == frozenset()
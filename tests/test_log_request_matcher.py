@@ -1,3 +1,8 @@
+import random
+import re
+
+from time import perf_counter
+
 from objects import LogRequestMatcher
 
 
@@ -28,3 +33,49 @@ def test_log_request_patterns():
     ]
     for message in should_not_match:
         assert matcher.test(message) == False
+
+
+def test_log_request_matcher_agrees_with_patterns():
+    matcher = LogRequestMatcher()
+    words = ["send", "share", "where", "what", "the", "your", "log", "logs",
+             "Logs", "say", "blog", ",", "\n", "file", "do", "can", "you",
+             "LOG.", "sAy", "resend", "logsay", "-", "1234567890abcdef"]
+    rng = random.Random(0)
+    for _ in range(5000):
+        separator = rng.choice([" ", "", "  "])
+        message = separator.join(
+            rng.choice(words) for _ in range(rng.randint(1, 14))
+        ) + rng.choice(["", "\n", "?"])
+        expected = any(
+            re.match(regex, message, re.IGNORECASE)
+            for regex in LogRequestMatcher.RE_AUTOLOG
+        )
+        assert matcher.test(message) == expected, repr(message)
+
+
+def test_log_request_matcher_is_fast_on_long_messages():
+    matcher = LogRequestMatcher()
+    messages = [
+        ("send log " * 500)[:3999] + "\n",
+        ("send log " * 500)[:3998] + "\nx",
+        ("where " * 700)[:4000],
+        ("what log " * 500)[:4000],
+        ("send " + "a" * 15 + " ") * 190 + "\n" + "log",
+        "x" * 3997 + "log",
+        (("l" + "o" * 10 + "g ") * 400)[:4000],
+        ("a log " * 700)[:4000],
+        # takes the patterns more than a second
+        ("what log say " * 400)[:4000] + "\nx",
+    ]
+    for message in messages:
+        assert len(message) >= 3990
+        start = perf_counter()
+        for _ in range(10):
+            result = matcher.test(message)
+        duration = (perf_counter() - start) / 10
+        assert duration < 0.005, (message[:20], duration)
+        expected = any(
+            re.match(regex, message, re.IGNORECASE)
+            for regex in LogRequestMatcher.RE_AUTOLOG
+        )
+        assert result == expected
@@ -0,0 +1,90 @@
+import json
+import sys
+
+import enums
+import migrate_settings
+
+from migrate_settings import iter_settings, migrate, verify
+from utils.settings_sqlite import SqliteSettings
+
+SOURCE = {
+    enums.SettingsKeys.ROLES: {"1": {"2": 3}, "4": {}},
+    enums.SettingsKeys.APPS: {"10": True, "11": True},
+    enums.SettingsKeys.USER_APPS: {
+        "5": {"12": {"app_id": 12, "user_id": 5, "timestamp": 100}}
+    },
+    enums.SettingsKeys.SPONSOR_PLATFORMS: {
+        "1": {"kofi": "☕", "patreon": {"emoji": "🎁", "url": "https://x"}}
+    },
+    enums.SettingsKeys.SPONSOR_ROLES: {"1": {"sponsor": 6}},
+    enums.SettingsKeys.SPONSOR_PLATFORM_ROLES: {"1": {"7": "kofi"}},
+    enums.SettingsKeys.AUTOLOG: ["1:9", "1:8"],
+    "other": {"a": 1},
+    "counter": 12345,
+}
+
+
+def test_migrate_settings_normalizes_and_verifies(tmp_path):
+    target = SqliteSettings(str(tmp_path / "settings.0.sqlite3"))
+
+    assert migrate(SOURCE.items(), target) == 12
+    assert verify(SOURCE.items(), target)
+    assert target.dget(enums.SettingsKeys.SPONSOR_PLATFORMS, "1")["kofi"] == {
+        "emoji": "☕",
+        "url": None,
+    }
+
+    target.dpop(enums.SettingsKeys.USER_APPS, "5")
+    assert not verify(SOURCE.items(), target)
+    target.close()
+
+
+def test_verify_notices_what_the_backend_drops(tmp_path):
+    source = {
+        enums.SettingsKeys.USER_APPS: {
+            "5": {"12": {"app_id": 12, "user_id": 5, "timestamp": 100, "name": "x"}}
+        },
+    }
+    target = SqliteSettings(str(tmp_path / "settings.0.sqlite3"))
+    migrate(source.items(), target)
+    assert not verify(source.items(), target)
+    target.close()
+
+
+def test_settings_are_read_in_parts(tmp_path, monkeypatch):
+    # splits numbers, strings and the structure between reads
+    monkeypatch.setattr(migrate_settings, "READ_SIZE", 3)
+    location = tmp_path / "settings.0.db"
+    location.write_text(json.dumps(SOURCE, indent=1))
+    assert dict(iter_settings(str(location))) == SOURCE
+
+    location.write_text("{ }")
+    assert list(iter_settings(str(location))) == []
+
+
+def test_migration_does_not_change_the_source(tmp_path, monkeypatch):
+    location = tmp_path / "settings.0.db"
+    location.write_text(json.dumps(SOURCE))
+    # changes that were not written to a snapshot yet
+    journal = [
+        ["dset", enums.SettingsKeys.APPS, "13", True],
+        ["del", "other"],
+        ["set", "new", [1]],
+    ]
+    (tmp_path / "settings.0.db.journal").write_text(
+        "".join(json.dumps(record) + "\n" for record in journal) + '["set", "x'
+    )
+    files = {path.name: path.read_bytes() for path in tmp_path.iterdir()}
+    target = tmp_path / "settings.0.sqlite3"
+
+    monkeypatch.setattr(sys, "argv", ["migrate_settings.py", str(location), str(target)])
+    assert migrate_settings.main() == 0
+    assert {
+        path.name: path.read_bytes() for path in tmp_path.iterdir() if path != target
+    } == files
+
+    migrated = SqliteSettings(str(target))
+    assert migrated.dexists(enums.SettingsKeys.APPS, "13")
+    assert not migrated.exists("other")
+    assert migrated.get("new") == [1]
+    migrated.close()
@@ -0,0 +1,116 @@
+import asyncio
+import discord
+
+from aiohttp import web
+from types import SimpleNamespace
+
+import enums
+
+from enums.constants import PLAYERS_CACHE_FILE
+from utils.players import PlayersCache, retry_delay
+
+
+def players_handler(state: dict):
+    async def handle(request: web.Request):
+        state["requests"] += 1
+        if request.headers.get("If-None-Match") == state["etag"]:
+            return web.Response(status=304)
+        players = [
+            {"extra": {"discord_application_id": str(app_id)}}
+            for app_id in state["app_ids"]
+        ]
+        return web.json_response(
+            {"players": players}, headers={"ETag": state["etag"]}
+        )
+
+    return handle
+
+
+def member(member_id: int, app_id: int):
+    activity = discord.Activity(
+        name="Music", type=discord.ActivityType.listening, application_id=app_id
+    )
+    return SimpleNamespace(id=member_id, activities=[activity])
+
+
+def test_update_apps_uses_conditional_requests(serve, make_bot_utils):
+    state = {"requests": 0, "etag": '"1"', "app_ids": [10, 11]}
+    members = [member(1, 10), member(2, 11), member(3, 12)]
+    role = SimpleNamespace(id=5, members=members)
+    guild = SimpleNamespace(id=4, get_role=lambda role_id: role)
+    bot_utils = make_bot_utils(SimpleNamespace(guilds=[guild]))
+    bot_utils.listener_roles[guild.id] = {role.id: role}
+    checked = []
+
+    async def check_member(member, priority):
+        checked.append(member.id)
+
+    bot_utils.check_member = check_member
+
+    async def run():
+        async with serve("GET", "/players.min.json", players_handler(state)) as url:
+            bot_utils.players_url = url
+            results = [await bot_utils.update_apps()]
+            results.append(await bot_utils.update_apps())
+            state["etag"], state["app_ids"] = '"2"', [10, 12]
+            results.append(await bot_utils.update_apps())
+            await bot_utils.check_app_members(results[-1])
+            await bot_utils.http.close()
+        return results
+
+    results = asyncio.run(run())
+    assert state["requests"] == 3
+    assert results[1] == set()
+    assert results[2] == {11, 12}
+    assert bot_utils.known_app_ids >= {10, 12}
+    assert 11 not in bot_utils.known_app_ids
+    assert bot_utils.players_cache.validators == {"etag": '"2"'}
+    assert PlayersCache(PLAYERS_CACHE_FILE).app_ids() == bot_utils.known_app_ids
+    assert checked == [2, 3]
+
+
+def test_players_cache_serves_stale_data_and_backs_off(
+    serve, make_bot_utils, monkeypatch
+):
+    monkeypatch.setattr("utils.players.PLAYERS_RETRY_BASE", 0.01)
+    assert all(0 <= retry_delay(n) <= 60 * 60 for n in range(50))
+
+    cache = PlayersCache(PLAYERS_CACHE_FILE)
+    cache.update({"players": [{"extra": {"discord_application_id": "10"}}]}, {})
+    state = {"requests": 0}
+
+    async def run(fetched_at: float, status: int):
+        async def handle(request: web.Request):
+            state["requests"] += 1
+            return web.Response(status=status)
+
+        bot_utils = make_bot_utils(SimpleNamespace(guilds=[]))
+        async with serve("GET", "/players.min.json", handle) as url:
+            bot_utils.players_url = url
+            bot_utils.players_cache.fetched_at = fetched_at
+            task = asyncio.create_task(bot_utils.update_apps_periodically())
+            await asyncio.sleep(0.5)
+            task.cancel()
+            await bot_utils.http.close()
+
+    # a fresh cache is used without downloading anything
+    asyncio.run(run(cache.fetched_at, 304))
+    assert state["requests"] == 0
+
+    # a stale one is downloaded again, with retries while that fails
+    asyncio.run(run(0, 503))
+    assert state["requests"] > 2
+    assert PlayersCache(PLAYERS_CACHE_FILE).app_ids() >= {10}
+
+
+def test_app_ids_are_loaded_from_the_players_cache(settings, make_bot_utils):
+    cache = PlayersCache(PLAYERS_CACHE_FILE)
+    cache.update(
+        {"players": [{"extra": {"discord_application_id": "10"}}]}, {"etag": '"1"'}
+    )
+
+    # e.g. a new settings backend, while the cache is fresh
+    bot_utils = make_bot_utils()
+    assert 10 in bot_utils.known_app_ids
+    assert bot_utils.known_app_ids == cache.app_ids()
+    assert settings.dexists(enums.SettingsKeys.APPS, "10")
@@ -0,0 +1,34 @@
+from objects import ReplyThrottle
+
+
+def test_reply_throttle_suppresses_replies_during_cooldown():
+    throttle = ReplyThrottle(cooldown=60, max_entries=100)
+    assert throttle.allow(1, 10, now=0)
+    assert not throttle.allow(1, 11, now=30)
+    assert throttle.allow(2, 10, now=30)
+    # the cooldown starts with the last reply, not the last suppressed one
+    assert throttle.allow(1, 11, now=60)
+    assert not throttle.allow(1, 10, now=119)
+    assert throttle.suppressed == 2
+
+
+def test_reply_throttle_per_user():
+    throttle = ReplyThrottle(cooldown=60, max_entries=100, per_user=True)
+    assert throttle.allow(1, 10, now=0)
+    assert throttle.allow(1, 11, now=1)
+    assert not throttle.allow(1, 10, now=2)
+    assert throttle.suppressed == 1
+
+
+def test_reply_throttle_is_bounded():
+    throttle = ReplyThrottle(cooldown=60, max_entries=3)
+    for channel_id in range(10):
+        assert throttle.allow(channel_id, 10, now=channel_id)
+    assert len(throttle) == 3
+    # the least recently replied to channels were forgotten
+    assert throttle.allow(0, 10, now=10)
+    assert not throttle.allow(9, 10, now=10)
+
+    # expired replies are dropped as well
+    assert throttle.allow(100, 10, now=1000)
+    assert len(throttle) == 1
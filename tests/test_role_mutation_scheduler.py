@@ -0,0 +1,143 @@
+import asyncio
+import aiohttp
+import discord
+
+from aiohttp import web
+
+from enums import MutationPriority
+from objects import RoleMutationScheduler
+
+
+def fake_api(rate_limited_requests: int):
+    requests = []
+
+    async def handle(request: web.Request):
+        requests.append(request.query["name"])
+        if len(requests) <= rate_limited_requests:
+            return web.json_response(
+                {"message": "You are being rate limited.", "retry_after": 0.05},
+                status=429,
+                headers={
+                    "Retry-After": "0.05",
+                    "X-RateLimit-Limit": "1",
+                    "X-RateLimit-Remaining": "0",
+                    "X-RateLimit-Reset-After": "0.05",
+                },
+            )
+        return web.Response(status=204)
+
+    return handle, requests
+
+
+def mutation(session: aiohttp.ClientSession, url: str, name: str):
+    async def request():
+        async with session.put(url, params={"name": name}) as response:
+            if response.status >= 400:
+                raise discord.HTTPException(response, await response.json())
+            return name
+
+    return request
+
+
+def test_scheduler_retries_rate_limited_requests(serve):
+    handle, requests = fake_api(rate_limited_requests=2)
+
+    async def run():
+        scheduler = RoleMutationScheduler(rate=100, burst=10, max_retries=3)
+        async with (
+            serve("PUT", "/roles", handle) as url,
+            aiohttp.ClientSession() as session,
+        ):
+            result = await scheduler.submit(
+                1, MutationPriority.PRESENCE, mutation(session, url, "a")
+            )
+        await scheduler.close()
+        return scheduler, result
+
+    scheduler, result = asyncio.run(run())
+    assert result == "a"
+    assert requests == ["a", "a", "a"]
+    assert scheduler.rate_limited == 2
+    assert scheduler.completed == 1
+    assert scheduler.backlog == 0
+
+
+def test_scheduler_gives_up_after_max_retries(serve):
+    handle, requests = fake_api(rate_limited_requests=10)
+
+    async def run():
+        scheduler = RoleMutationScheduler(rate=100, burst=10, max_retries=1)
+        async with (
+            serve("PUT", "/roles", handle) as url,
+            aiohttp.ClientSession() as session,
+        ):
+            try:
+                await scheduler.submit(
+                    1, MutationPriority.PRESENCE, mutation(session, url, "a")
+                )
+            except discord.HTTPException as e:
+                error = e
+        await scheduler.close()
+        return scheduler, error
+
+    scheduler, error = asyncio.run(run())
+    assert error.status == 429
+    assert len(requests) == 2
+    assert scheduler.failed == 1
+
+
+def test_scheduler_runs_higher_priorities_first(serve):
+    handle, requests = fake_api(rate_limited_requests=1)
+
+    async def run():
+        scheduler = RoleMutationScheduler(rate=100, burst=10, max_retries=3)
+        async with (
+            serve("PUT", "/roles", handle) as url,
+            aiohttp.ClientSession() as session,
+        ):
+            sweep = [
+                asyncio.create_task(
+                    scheduler.submit(
+                        1, MutationPriority.SWEEP, mutation(session, url, f"s{i}")
+                    )
+                )
+                for i in range(3)
+            ]
+            while scheduler.rate_limited == 0:
+                await asyncio.sleep(0.01)
+            assert scheduler.backlog_by_guild() == {1: 3}
+            interactive = asyncio.create_task(
+                scheduler.submit(
+                    1, MutationPriority.INTERACTIVE, mutation(session, url, "i")
+                )
+            )
+            await asyncio.gather(*sweep, interactive)
+        await scheduler.close()
+
+    asyncio.run(run())
+    # s0 was rate limited while i was queued, so i pre-empts its retry
+    assert requests == ["s0", "i", "s0", "s1", "s2"]
+
+
+def test_scheduler_backs_off_when_discord_gives_up_waiting():
+    # discord.py raises RateLimited instead of sleeping through a rate limit
+    # longer than the client's max_ratelimit_timeout
+    attempts = []
+
+    async def request():
+        attempts.append(asyncio.get_running_loop().time())
+        if len(attempts) == 1:
+            raise discord.RateLimited(0.2)
+        return "a"
+
+    async def run():
+        scheduler = RoleMutationScheduler(rate=100, burst=10, max_retries=3)
+        change = scheduler.enqueue(1, MutationPriority.PRESENCE, request)
+        result = await change
+        await scheduler.close()
+        return scheduler, result
+
+    scheduler, result = asyncio.run(run())
+    assert result == "a"
+    assert attempts[1] - attempts[0] >= 0.2
+    assert scheduler.rate_limited == 1
@@ -0,0 +1,109 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from utils.settings_journal import JournalSettings
+
+
+def test_journal_settings_replays_changes(tmp_path):
+    location = str(tmp_path / "settings.0.db")
+    settings = JournalSettings(location)
+    settings.dcreate("roles")
+    settings.dadd("roles", ("1", {"2": 3}))
+    settings.dadd("roles", ("4", {}))
+    settings.dpop("roles", "4")
+    settings.lcreate("autolog")
+    settings.ladd("autolog", "1:2")
+    settings.ladd("autolog", "1:3")
+    settings.lremvalue("autolog", "1:2")
+    # the process stops without writing a snapshot
+    settings.timer.cancel()
+
+    settings = JournalSettings(location)
+    assert settings.dget("roles", "1") == {"2": 3}
+    assert not settings.dexists("roles", "4")
+    assert settings.lexists("autolog", "1:3")
+    assert not settings.lexists("autolog", "1:2")
+    assert settings.get("missing") is False
+
+
+def test_journal_settings_ignores_incomplete_record(tmp_path):
+    location = str(tmp_path / "settings.0.db")
+    settings = JournalSettings(location)
+    settings.set("apps", {"1": True})
+    settings.journal.write('["set", "apps", {"2"')
+    settings.journal.flush()
+    settings.timer.cancel()
+
+    settings = JournalSettings(location)
+    assert settings.get("apps") == {"1": True}
+    settings.set("apps", {"3": True})
+    assert JournalSettings(location).get("apps") == {"3": True}
+
+
+def test_journal_settings_coalesces_snapshots(tmp_path):
+    location = tmp_path / "settings.0.db"
+    settings = JournalSettings(str(location), flush_interval=0.2)
+    settings.dcreate("user_apps")
+    for i in range(25):
+        settings.dadd("user_apps", (str(i), {}))
+
+    while settings.flushes == 0 or settings.records > 0:
+        time.sleep(0.01)
+    # a burst of changes is written in at most two snapshots
+    assert settings.flushes <= 2
+    assert len(json.loads(location.read_text())["user_apps"]) == 25
+    assert settings.bytes_written >= location.stat().st_size
+
+    settings.dpop("user_apps", "0")
+    settings.close()
+    assert not JournalSettings(str(location)).dexists("user_apps", "0")
+
+
+CRASHING_WRITER = """
+import os
+import sys
+import time
+from utils.settings_journal import JournalSettings
+
+location, stage = sys.argv[1:]
+settings = JournalSettings(location)
+settings.set("big", {str(i): "x" * 20 for i in range(10_000)})
+settings.dump()
+
+# stops the process at the given stage of the next flush
+replace, remove = os.replace, os.remove
+def pause(name, suffix, function):
+    def paused(path, *args):
+        if stage == name and path.endswith(suffix):
+            print(stage, flush=True)
+            time.sleep(60)
+        function(path, *args)
+    return paused
+os.replace = pause("rename", ".tmp", replace)
+os.remove = pause("cleanup", ".compacting", remove)
+
+settings.set("counter", 1)
+settings.dump()
+"""
+
+
+def test_journal_settings_survives_kill_during_flush(tmp_path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for stage in ("rename", "cleanup"):
+        location = tmp_path / f"{stage}.db"
+        process = subprocess.Popen(
+            [sys.executable, "-c", CRASHING_WRITER, str(location), stage],
+            cwd=root,
+            stdout=subprocess.PIPE,
+        )
+        assert process.stdout.readline().strip() == stage.encode()
+        process.kill()
+        process.wait()
+
+        settings = JournalSettings(str(location))
+        assert len(settings.get("big")) == 10_000
+        assert settings.get("counter") == 1
+        settings.close()
@@ -0,0 +1,34 @@
+import enums
+
+from utils.settings_sqlite import SqliteSettings
+
+
+def test_sqlite_settings_round_trip(tmp_path):
+    location = str(tmp_path / "settings.0.sqlite3")
+    settings = SqliteSettings(location)
+    settings.dcreate(enums.SettingsKeys.ROLES)
+    settings.dadd(enums.SettingsKeys.ROLES, ("1", {"2": 3, "4": 5}))
+    settings.dadd(enums.SettingsKeys.ROLES, ("6", {}))
+    settings.dpop(enums.SettingsKeys.ROLES, "6")
+    settings.lcreate(enums.SettingsKeys.AUTOLOG)
+    settings.ladd(enums.SettingsKeys.AUTOLOG, "1:2")
+    settings.ladd(enums.SettingsKeys.AUTOLOG, "1:3")
+    settings.lremvalue(enums.SettingsKeys.AUTOLOG, "1:2")
+    settings.set("other", {"a": [1]})
+    settings.close()
+
+    settings = SqliteSettings(location)
+    assert settings.dget(enums.SettingsKeys.ROLES, "1") == {"2": 3, "4": 5}
+    assert not settings.dexists(enums.SettingsKeys.ROLES, "6")
+    assert settings.get(enums.SettingsKeys.AUTOLOG) == ["1:3"]
+    assert settings.lexists(enums.SettingsKeys.AUTOLOG, "1:3")
+    assert settings.get("other") == {"a": [1]}
+    assert settings.get("missing") is False
+
+
+def test_sqlite_settings_normalizes_legacy_sponsor_platforms(tmp_path):
+    settings = SqliteSettings(str(tmp_path / "settings.0.sqlite3"))
+    settings.dadd(enums.SettingsKeys.SPONSOR_PLATFORMS, ("1", {"kofi": "☕"}))
+    assert settings.dget(enums.SettingsKeys.SPONSOR_PLATFORMS, "1") == {
+        "kofi": {"emoji": "☕", "url": None}
+    }
@@ -0,0 +1,84 @@
+import asyncio
+
+from types import SimpleNamespace
+
+import enums
+
+from objects import UserAppRegistry
+
+
+def test_registry_expires_only_outdated_apps():
+    registry = UserAppRegistry()
+    registry.add(1, 10, timestamp=100)
+    registry.add(2, 10, timestamp=200)
+    registry.add(2, 11, timestamp=50)
+    registry.touch(1, 10, timestamp=300)
+
+    assert registry.expire(before=250) == [(2, 11), (2, 10)]
+    assert registry.get(1) == {10: 300}
+    assert registry.get(2) is None
+    assert registry.users_of(10) == {1}
+    assert len(registry) == 1
+    assert registry.expire(before=250) == []
+
+
+def test_registry_removes_apps_through_reverse_index():
+    registry = UserAppRegistry()
+    for user_id in range(5):
+        registry.add(user_id, 10 + user_id % 2, timestamp=100)
+
+    assert registry.remove_app(10) == {0, 2, 4}
+    assert registry.app_ids() == {11}
+    assert registry.get(0) is None
+    registry.remove_user(1)
+    assert registry.users_of(11) == {3}
+    assert registry.expire(before=1000) == [(3, 11)]
+    assert len(registry) == 0
+
+
+def test_registry_drops_outdated_heap_entries():
+    registry = UserAppRegistry()
+    registry.add(1, 10, timestamp=0)
+    for timestamp in range(1, 1000):
+        registry.touch(1, 10, timestamp)
+    assert len(registry.expiry) <= 2 * len(registry) + 64
+    assert registry.expire(before=999) == []
+    assert registry.expire(before=1000) == [(1, 10)]
+
+
+def test_revoke_user_app_rechecks_its_users(settings, make_bot_utils):
+    members = {user_id: SimpleNamespace(id=user_id) for user_id in (1, 2, 3)}
+    guild = SimpleNamespace(id=4, get_member=members.get)
+    bot_utils = make_bot_utils(SimpleNamespace(guilds=[guild]))
+    bot_utils.register_user_app(1, 10)
+    bot_utils.register_user_app(2, 10)
+    bot_utils.register_user_app(3, 11)
+    checked = []
+
+    async def check_member(member, priority):
+        checked.append(member.id)
+
+    bot_utils.check_member = check_member
+
+    assert bot_utils.get_app_users(10) == {1, 2}
+    assert asyncio.run(bot_utils.revoke_user_app(10)) == {1, 2}
+    assert sorted(checked) == [1, 2]
+    assert bot_utils.get_app_users(10) == set()
+    assert not settings.dexists(enums.SettingsKeys.USER_APPS, "1")
+    assert settings.dexists(enums.SettingsKeys.USER_APPS, "3")
+
+
+def test_purge_removes_only_added_app_ids(settings, bot_utils):
+    bot_utils.register_user_app(1, 10)
+    bot_utils.register_user_app(2, 10)
+    bot_utils.register_user_app(3, 11)
+
+    def app_ids():
+        raise AssertionError("all registered app IDs were scanned")
+
+    bot_utils.user_apps.app_ids = app_ids
+    assert asyncio.run(bot_utils.purge_user_app_ids({10, 12})) == {1, 2}
+    assert bot_utils.get_app_users(10) == set()
+    assert bot_utils.get_app_users(11) == {3}
+    assert not settings.dexists(enums.SettingsKeys.USER_APPS, "1")
+    assert settings.dexists(enums.SettingsKeys.USER_APPS, "3")
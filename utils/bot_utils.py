@@ -1,9 +1,6 @@
 import asyncio
-import json
 import sqlite3
 import re
-import aiohttp
-import pickledb
 import discord
 import dataclasses
 
@@ -11,20 +8,42 @@ import enums
 import objects
 
 from collections import defaultdict
+from collections.abc import Iterable
+from functools import partial
 from typing import Optional
-from time import time
+from time import monotonic, time
 
 from enums.constants import (
+    AUTOLOG_MATCHER_CACHE_SIZE,
+    AUTOLOG_MAX_PATTERNS,
+    AUTOLOG_PATTERN_MAX_INPUT,
+    AUTOLOG_PATTERN_MAX_LENGTH,
+    AUTOLOG_REPLY_COOLDOWN,
+    AUTOLOG_REPLY_MAX_ENTRIES,
+    AUTOLOG_REPLY_PER_USER,
     MIN_RETENTION_UPDATE_INTERVAL,
     MAX_USER_APP_ID_RETENTION,
     MUSIC_APP_ID,
+    PRESENCE_WORKERS,
+    ROLE_MUTATION_BURST,
+    ROLE_MUTATION_MAX_RETRIES,
+    ROLE_MUTATION_RATE,
+    SWEEP_GUILD_CONCURRENCY,
+    SWEEP_YIELD_INTERVAL,
+    USER_APP_FLUSH_INTERVAL,
     PODCAST_APP_ID,
+    PLAYERS_CACHE_FILE,
     PLAYERS_JSON_URL,
+    PLAYERS_REFRESH_INTERVAL,
     HELP_DOWNLOAD_URLS_FORMAT,
     HELP_MESSAGE_LINES,
 )
 from objects import LogRequestMatcher
 from utils.github_cached import latest_github_release_version
+from utils.http_client import HttpClient
+from utils.players import PlayersCache, discord_app_ids, fetch_players, retry_delay
+from utils.settings_journal import JournalSettings
+from utils.settings_sqlite import SqliteSettings
 from utils.macros_database import macros_list
 
 
@@ -39,131 +58,524 @@ class BotUtils:
         self,
         client: discord.Client,
         macros_db: sqlite3.Connection,
-        settings: pickledb.PickleDB,
+        settings: JournalSettings | SqliteSettings,
         tree: discord.app_commands.CommandTree,
     ):
         self.macros_db = macros_db
         self.client = client
         self.settings = settings
+        # Shared by all outgoing requests, opened and closed with the client
+        self.http = HttpClient()
+        self.players_url = PLAYERS_JSON_URL
+        self.players_cache = PlayersCache(PLAYERS_CACHE_FILE)
         self.tree = tree
         self.macros_cache = []
+        self.log_request_matcher = LogRequestMatcher()
+        # (guild id, channel id) of the channels in the AUTOLOG setting,
+        # so messages in other channels are skipped without a lookup.
+        self.observed_channels: set[tuple[int, int]] = set()
+        # guild id -> custom autolog patterns, compiled when they change
+        # and kept in a bounded cache, so messages never compile them.
+        self.autolog_patterns: dict[int, tuple[str, ...]] = {}
+        self.autolog_matchers = objects.AutologPatternCache(
+            AUTOLOG_MATCHER_CACHE_SIZE
+        )
+        # Several people asking for logs at once get a single reply
+        self.autolog_throttle = objects.ReplyThrottle(
+            AUTOLOG_REPLY_COOLDOWN, AUTOLOG_REPLY_MAX_ENTRIES, AUTOLOG_REPLY_PER_USER
+        )
+        self.known_app_ids: frozenset[int] = frozenset()
+        self.user_apps = objects.UserAppRegistry()
+        # users whose timestamps changed since they were last written
+        self.dirty_user_apps: set[int] = set()
+        # guild id -> parsed ROLES and SPONSOR_* settings, loaded on first
+        # use. Changes go through the setters below, which write them back.
+        # This saves parsing, not memory: the journal settings backend
+        # keeps the raw settings in memory as well.
+        self.guild_configs: dict[int, objects.GuildConfig] = {}
+        # guild id -> {for role id -> listener role}, kept in sync with
+        # the ROLES setting so the presence handlers never touch settings.
+        # Guilds that are not available yet have no entry.
+        self.listener_roles: dict[int, dict[int, discord.Role]] = {}
+        # The listener roles the bot gave or is giving to members,
+        # since member.roles lags behind until the gateway reports the change.
+        self.listener_states = objects.ListenerStateCache()
+        # All role changes go through here, so bulk changes
+        # never hold up changes that someone is waiting for.
+        self.role_scheduler = objects.RoleMutationScheduler(
+            ROLE_MUTATION_RATE, ROLE_MUTATION_BURST, ROLE_MUTATION_MAX_RETRIES
+        )
+        # Presence updates are keyed by (guild id, member id),
+        # so only the latest state of a member is checked.
+        self.presence_queue = objects.CoalescingQueue(
+            self.check_member, PRESENCE_WORKERS
+        )
 
         self.update_macros_cache()
+        self.load_app_ids()
+        self.load_observed_channels()
+        self.load_autolog_patterns()
 
-    def get_role_listener(
-        self, guild: discord.Guild, role: discord.Role
-    ) -> discord.Role | None:
-        role_id = str(role.id)
-        guild_id = str(guild.id)
-        if self.settings.dexists(enums.SettingsKeys.ROLES, guild_id):
-            guild_roles = self.settings.dget(enums.SettingsKeys.ROLES, guild_id)
-            if role_id in guild_roles:
-                listener_role_id = guild_roles[role_id]
-                listener_role = guild.get_role(listener_role_id)
-                if listener_role is None:
-                    # the role seems to have been deleted
-                    del guild_roles[role_id]
-                    self.settings.dadd(
-                        enums.SettingsKeys.ROLES, (guild_id, guild_roles)
-                    )
-
-                return listener_role
-
+    def _guild_setting(self, key: enums.SettingsKeys, guild_id: int):
+        if self.settings.dexists(key, str(guild_id)):
+            return self.settings.dget(key, str(guild_id))
         return None
 
-    def get_roles_listeners_of_guild(self, guild: discord.Guild) -> list[discord.Role]:
-        guild_id = str(guild.id)
-        roles = []
-        if self.settings.dexists(enums.SettingsKeys.ROLES, guild_id):
-            guild_roles = self.settings.dget(enums.SettingsKeys.ROLES, guild_id)
+    def get_guild_config(self, guild_id: int) -> objects.GuildConfig:
+        config = self.guild_configs.get(guild_id)
+        if config is None:
+            config = objects.GuildConfig.from_settings(
+                guild_id,
+                self._guild_setting(enums.SettingsKeys.ROLES, guild_id),
+                self._guild_setting(enums.SettingsKeys.SPONSOR_ROLES, guild_id),
+                self._guild_setting(enums.SettingsKeys.SPONSOR_PLATFORMS, guild_id),
+                self._guild_setting(
+                    enums.SettingsKeys.SPONSOR_PLATFORM_ROLES, guild_id
+                ),
+            )
+            self.guild_configs[guild_id] = config
+        return config
+
+    def save_listener_roles(self, config: objects.GuildConfig):
+        guild_id = str(config.guild_id)
+        if config.listener_roles is not None:
+            self.settings.dadd(
+                enums.SettingsKeys.ROLES, (guild_id, config.roles_setting())
+            )
+        elif self.settings.dexists(enums.SettingsKeys.ROLES, guild_id):
+            self.settings.dpop(enums.SettingsKeys.ROLES, guild_id)
 
-            modified = False
-            for role_id, listener_role_id in guild_roles.items():
+    def set_role_listener(
+        self,
+        guild: discord.Guild,
+        role: discord.Role,
+        listener_role: discord.Role | None,
+    ):
+        config = self.get_guild_config(guild.id)
+        if config.listener_roles is None:
+            config.listener_roles = {}
+        if listener_role is None:
+            config.listener_roles.pop(role.id, None)
+        else:
+            config.listener_roles[role.id] = listener_role.id
+        self.save_listener_roles(config)
+        self.index_listener_roles(guild)
+
+    def reset_listener_roles(self, guild: discord.Guild):
+        config = self.get_guild_config(guild.id)
+        config.listener_roles = None
+        self.save_listener_roles(config)
+        self.unindex_listener_roles(guild)
+
+    def index_listener_roles(self, guild: discord.Guild):
+        config = self.get_guild_config(guild.id)
+        index: dict[int, discord.Role] = {}
+        if config.listener_roles is not None:
+            deleted = []
+            for role_id, listener_role_id in config.listener_roles.items():
                 listener_role = guild.get_role(listener_role_id)
                 if listener_role is None:
                     # the role seems to have been deleted
-                    del guild_roles[role_id]
-                    modified = True
+                    deleted.append(role_id)
                 else:
-                    roles.append(listener_role)
+                    index[role_id] = listener_role
 
-            if modified:
-                self.settings.dadd(enums.SettingsKeys.ROLES, (guild_id, guild_roles))
+            if deleted:
+                for role_id in deleted:
+                    del config.listener_roles[role_id]
+                self.save_listener_roles(config)
 
-        return roles
+        self.listener_roles[guild.id] = index
+        self.listener_states.forget_guild(guild.id)
+
+    def unindex_listener_roles(self, guild: discord.Guild):
+        self.listener_roles.pop(guild.id, None)
+        self.listener_states.forget_guild(guild.id)
+
+    def remove_deleted_role(self, role: discord.Role):
+        index = self.listener_roles.get(role.guild.id)
+        if index is None:
+            return
+
+        if role.id in index:
+            self.set_role_listener(role.guild, role, None)
+        elif role in index.values():
+            # listener roles that no longer exist are dropped when indexing
+            self.index_listener_roles(role.guild)
+
+    def get_role_listener(
+        self, guild: discord.Guild, role: discord.Role
+    ) -> discord.Role | None:
+        index = self.listener_roles.get(guild.id)
+        if index is None:
+            return None
+        return index.get(role.id)
+
+    def get_roles_listeners_of_guild(self, guild: discord.Guild) -> list[discord.Role]:
+        index = self.listener_roles.get(guild.id)
+        if index is None:
+            return []
+        return list(dict.fromkeys(index.values()))
+
+    def get_desired_listener_role(self, member: discord.Member) -> discord.Role | None:
+        index = self.listener_roles.get(member.guild.id)
+        if index is None:
+            return None
 
-    async def give_role_listener(self, member: discord.Member):
         for role in reversed(member.roles):
-            listener_role = self.get_role_listener(member.guild, role)
+            listener_role = index.get(role.id)
             if listener_role is not None:
-                if listener_role not in member.roles:
-                    await member.add_roles(listener_role)
-                return
+                return listener_role
+
+        return None
 
-    async def clear_role_listeners_of_member(self, member: discord.Member):
-        for listener_role in self.get_roles_listeners_of_guild(member.guild):
-            if listener_role in member.roles:
-                await member.remove_roles(listener_role)
+    def get_member_listener_role_ids(self, member: discord.Member) -> frozenset[int]:
+        index = self.listener_roles.get(member.guild.id)
+        if index is None:
+            return frozenset()
+        listener_role_ids = {role.id for role in index.values()}
+        return frozenset(role.id for role in member.roles if role.id in listener_role_ids)
+
+    def observe_member_update(self, member: discord.Member) -> bool:
+        # Returns whether the listener roles of the member were changed
+        # by someone else and have to be checked again.
+        if not self.listener_roles.get(member.guild.id):
+            return False
+        return self.listener_states.reconcile(
+            member.guild.id, member.id, self.get_member_listener_role_ids(member)
+        )
+
+    async def set_listener_role(
+        self,
+        member: discord.Member,
+        listener_role: discord.Role | None,
+        priority: enums.MutationPriority,
+    ) -> asyncio.Future | None:
+        # Replace all listener roles of the member with the given one,
+        # and only if anything actually changes. Only listener roles are
+        # touched, so roles changed by others in the meantime are kept.
+        # Returns the queued change without waiting for it, so a busy guild
+        # never holds up the presence workers for other guilds.
+        desired = (
+            frozenset((listener_role.id,)) if listener_role is not None else frozenset()
+        )
+        if self.listener_states.get(member.guild.id, member.id) == desired:
+            # already given, or the request for it is still in flight
+            return None
+
+        current = self.get_member_listener_role_ids(member)
+        if current == desired:
+            self.listener_states.set(member.guild.id, member.id, desired)
+            return None
+
+        async def edit_roles():
+            # member.roles might have changed while this was queued
+            current = self.get_member_listener_role_ids(member)
+            remove = [
+                role
+                for role in member.roles
+                if role.id in current and role.id not in desired
+            ]
+            if remove:
+                await member.remove_roles(*remove)
+            if listener_role is not None and listener_role.id not in current:
+                await member.add_roles(listener_role)
+
+        self.listener_states.set(member.guild.id, member.id, desired, pending=True)
+        change = self.role_scheduler.enqueue(member.guild.id, priority, edit_roles)
+        change.add_done_callback(
+            lambda change: self.listener_role_changed(member, desired, change)
+        )
+        return change
+
+    def listener_role_changed(
+        self, member: discord.Member, desired: frozenset[int], change: asyncio.Future
+    ):
+        guild_id, member_id = member.guild.id, member.id
+        if not change.cancelled() and change.exception() is None:
+            self.listener_states.confirm(guild_id, member_id, desired)
+            return
+
+        if not change.cancelled():
+            print(
+                f"Failed to change the listener role of member {member_id} "
+                f"in {guild_id}: {change.exception()}"
+            )
+        if self.listener_states.is_pending(guild_id, member_id) and (
+            self.listener_states.get(guild_id, member_id) == desired
+        ):
+            # checked again with the next presence update, whatever it changes
+            self.listener_states.forget(guild_id, member_id)
 
     async def clear_role_listener_of_role(
         self, guild: discord.Guild, role: discord.Role
     ) -> discord.Role | None:
         listener_role = self.get_role_listener(guild, role)
         if listener_role is not None:
-            for member in listener_role.members:
-                await member.remove_roles(listener_role)
+            await asyncio.gather(
+                *(
+                    self.role_scheduler.enqueue(
+                        guild.id,
+                        enums.MutationPriority.INTERACTIVE,
+                        partial(member.remove_roles, listener_role),
+                    )
+                    for member in listener_role.members
+                )
+            )
 
         return listener_role
 
     async def remove_all_listener_roles_from_all(self, guild: discord.Guild):
-        for listener_role in self.get_roles_listeners_of_guild(guild):
-            for member in guild.members:
-                if listener_role in member.roles:
-                    await member.remove_roles(listener_role)
+        await asyncio.gather(
+            *(
+                self.role_scheduler.enqueue(
+                    guild.id,
+                    enums.MutationPriority.INTERACTIVE,
+                    partial(member.remove_roles, listener_role),
+                )
+                for listener_role in self.get_roles_listeners_of_guild(guild)
+                for member in guild.members
+                if listener_role in member.roles
+            )
+        )
 
-    async def check_member(self, member: discord.Member):
-        if member.status in (discord.Status.invisible, discord.Status.offline):
-            return await self.clear_role_listeners_of_member(member)
+    def load_app_ids(self):
+        self.known_app_ids = frozenset(
+            int(app_id) for app_id in self.settings.get(enums.SettingsKeys.APPS)
+        )
+        # The cached players list goes with the validators used for the next
+        # download, so it takes precedence. Otherwise a "not modified"
+        # response would keep app IDs that don't match it, e.g. none at all
+        # after switching to a new settings backend.
+        cached_app_ids = self.players_cache.app_ids()
+        if cached_app_ids is not None and cached_app_ids != self.known_app_ids:
+            print(
+                f"Using {len(cached_app_ids)} application IDs from the players cache "
+                f"instead of {len(self.known_app_ids)} from settings"
+            )
+            self.settings.set(
+                enums.SettingsKeys.APPS,
+                {str(app_id): True for app_id in cached_app_ids},
+            )
+            self.known_app_ids = frozenset(cached_app_ids)
+        self.user_apps = objects.UserAppRegistry()
+        for user_id, apps in self.settings.get(enums.SettingsKeys.USER_APPS).items():
+            for app_id, info in apps.items():
+                self.user_apps.add(int(user_id), int(app_id), info["timestamp"])
 
-        apps = self.settings.get(enums.SettingsKeys.APPS)
-        user_apps = {}
-        if self.settings.dexists(enums.SettingsKeys.USER_APPS, str(member.id)):
-            user_apps = self.settings.dget(enums.SettingsKeys.USER_APPS, str(member.id))
+    def is_known_app(self, app_id: int) -> bool:
+        return app_id in self.known_app_ids
 
-        for activity in member.activities:
-            if (
-                not isinstance(activity, discord.Spotify)
-                and isinstance(activity, discord.Activity)
-                and (
-                    str(activity.application_id) in apps
-                    or str(activity.application_id) in user_apps
+    def user_apps_entry(self, user_id: int) -> dict[str, dict]:
+        return {
+            str(app_id): dataclasses.asdict(
+                objects.UserApp(app_id, user_id=user_id, timestamp=timestamp)
+            )
+            for app_id, timestamp in self.user_apps.get(user_id).items()
+        }
+
+    def save_user_apps(self, user_id: int):
+        self.dirty_user_apps.discard(user_id)
+        if self.user_apps.get(user_id) is not None:
+            self.settings.dadd(
+                enums.SettingsKeys.USER_APPS,
+                (str(user_id), self.user_apps_entry(user_id)),
+            )
+        elif self.settings.dexists(enums.SettingsKeys.USER_APPS, str(user_id)):
+            self.settings.dpop(enums.SettingsKeys.USER_APPS, str(user_id))
+
+    def flush_user_apps(self):
+        if not self.dirty_user_apps:
+            return
+
+        for user_id in self.dirty_user_apps:
+            if self.user_apps.get(user_id) is not None:
+                self.settings.dadd(
+                    enums.SettingsKeys.USER_APPS,
+                    (str(user_id), self.user_apps_entry(user_id)),
                 )
+        print(f"Wrote user app timestamps of {len(self.dirty_user_apps)} users")
+        self.dirty_user_apps.clear()
+
+    async def flush_user_apps_periodically(self):
+        while True:
+            await asyncio.sleep(USER_APP_FLUSH_INTERVAL)
+            self.flush_user_apps()
+
+    def register_user_app(self, user_id: int, app_id: int):
+        # Only one custom app ID is allowed per user.
+        self.user_apps.remove_user(user_id)
+        self.user_apps.add(user_id, app_id, int(time()))
+        self.save_user_apps(user_id)
+
+    def delete_user_apps(self, user_id: int):
+        self.user_apps.remove_user(user_id)
+        self.save_user_apps(user_id)
+
+    def get_app_users(self, app_id: int) -> set[int]:
+        return self.user_apps.users_of(app_id)
+
+    async def revoke_user_app(self, app_id: int) -> set[int]:
+        user_ids = self.user_apps.remove_app(app_id)
+        for user_id in user_ids:
+            self.save_user_apps(user_id)
+        for guild in self.client.guilds:
+            for user_id in user_ids:
+                member = guild.get_member(user_id)
+                if member is not None:
+                    await self.check_member(
+                        member, enums.MutationPriority.INTERACTIVE
+                    )
+        return user_ids
+
+    def touch_user_app(self, user_id: int, app_id: int):
+        # Update the timestamp to the current time since this user app ID
+        # was used now. Make sure it's not updated too frequently though.
+        timestamps = self.user_apps.get(user_id)
+        now = int(time())
+        if timestamps[app_id] + MIN_RETENTION_UPDATE_INTERVAL < now:
+            self.user_apps.touch(user_id, app_id, now)
+            self.dirty_user_apps.add(user_id)
+
+    def get_listening_app_ids(self, member: discord.Member) -> set[int]:
+        known_app_ids = self.known_app_ids
+        user_app_ids = self.user_apps.get(member.id) or {}
+        return {
+            activity.application_id
+            for activity in member.activities
+            if not isinstance(activity, discord.Spotify)
+            and isinstance(activity, discord.Activity)
+            and (
+                activity.application_id in known_app_ids
+                or activity.application_id in user_app_ids
+            )
+        }
+
+    def is_listener_change(
+        self, before: discord.Member, after: discord.Member
+    ) -> bool:
+        # Track changes within the same activity only update its details,
+        # which never changes whether the member should have a listener role.
+        if not self.listener_roles.get(after.guild.id):
+            return False
+        # Never checked, or the last change failed
+        if self.listener_states.get(after.guild.id, after.id) is None:
+            return True
+        offline = (discord.Status.invisible, discord.Status.offline)
+        if (before.status in offline) != (after.status in offline):
+            return True
+        return self.get_listening_app_ids(before) != self.get_listening_app_ids(
+            after
+        )
+
+    def queue_presence_update(self, before: discord.Member, member: discord.Member):
+        if self.is_listener_change(before, member):
+            self.presence_queue.put((member.guild.id, member.id), member)
+
+    def queue_member_update(self, before: discord.Member, member: discord.Member):
+        changed_by_others = self.observe_member_update(member)
+        if changed_by_others or self.is_for_role_change(before, member):
+            self.presence_queue.put((member.guild.id, member.id), member)
+
+    def is_for_role_change(self, before: discord.Member, after: discord.Member) -> bool:
+        # Gaining or losing a role the listener role is given for changes
+        # which listener role a member should have, without any presence update.
+        index = self.listener_roles.get(after.guild.id)
+        if not index:
+            return False
+        return {role.id for role in before.roles if role.id in index} != {
+            role.id for role in after.roles if role.id in index
+        }
+
+    async def check_member(
+        self,
+        member: discord.Member,
+        priority: enums.MutationPriority = enums.MutationPriority.PRESENCE,
+    ) -> asyncio.Future | None:
+        if member.status in (discord.Status.invisible, discord.Status.offline):
+            return await self.set_listener_role(member, None, priority)
+
+        known_app_ids = self.known_app_ids
+        user_app_ids = self.user_apps.get(member.id)
+        for activity in member.activities:
+            if isinstance(activity, discord.Spotify) or not isinstance(
+                activity, discord.Activity
             ):
-                app_id_key = str(activity.application_id)
-                if app_id_key in user_apps:
-                    # Update the timestamp to the current time
-                    # since this user app ID was used now.
-                    info = objects.UserApp(**user_apps[app_id_key])
-                    now = int(time())
-                    if info.timestamp + MIN_RETENTION_UPDATE_INTERVAL < now:
-                        # Make sure it's not updated too frequently though
-                        info.timestamp = now
-                        user_apps[app_id_key] = dataclasses.asdict(info)
-                        self.settings.dadd(
-                            enums.SettingsKeys.USER_APPS, (str(member.id), user_apps)
-                        )
-                return await self.give_role_listener(member)
-
-        await self.clear_role_listeners_of_member(member)
+                continue
+
+            app_id = activity.application_id
+            if user_app_ids is not None and app_id in user_app_ids:
+                self.touch_user_app(member.id, app_id)
+            elif app_id not in known_app_ids:
+                continue
+
+            return await self.set_listener_role(
+                member, self.get_desired_listener_role(member), priority
+            )
+
+        return await self.set_listener_role(member, None, priority)
+
+    async def sweep_member(self, member: discord.Member):
+        change = await self.check_member(member, enums.MutationPriority.SWEEP)
+        if change is not None:
+            # Sweeps go at the pace of the scheduler instead of queueing
+            # every change at once. Failures are logged when they happen.
+            await asyncio.wait([change])
+
+    def get_sweep_candidates(self, guild: discord.Guild) -> list[discord.Member]:
+        # Only members with a configured role or a listener role
+        # can ever need a change, everyone else can be skipped.
+        index = self.listener_roles.get(guild.id)
+        if index is None:
+            return guild.members
+
+        roles = {role.id: role for role in index.values()}
+        for for_role_id in index:
+            for_role = guild.get_role(for_role_id)
+            if for_role is not None:
+                roles[for_role_id] = for_role
+
+        candidates: dict[int, discord.Member] = {}
+        for role in roles.values():
+            for member in role.members:
+                candidates[member.id] = member
+        return list(candidates.values())
 
     async def check_guild(self, guild: discord.Guild):
-        if self.settings.dexists(enums.SettingsKeys.ROLES, str(guild.id)):
-            for member in guild.members:
-                await self.check_member(member)
+        if not self.listener_roles.get(guild.id):
+            return
+
+        start = monotonic()
+        members = self.get_sweep_candidates(guild)
+        for i, member in enumerate(members, 1):
+            await self.sweep_member(member)
+            if i % SWEEP_YIELD_INTERVAL == 0:
+                # keep presence updates and commands responsive
+                await asyncio.sleep(0)
+
+        duration = monotonic() - start
+        print(
+            f"Checked {len(members)}/{guild.member_count} members "
+            f"of {guild.name} ({guild.id}) "
+            f"in {duration:.1f}s ({len(members) / max(duration, 1e-6):.0f}/s)"
+        )
 
-    async def check_guilds(self):
-        for guild in self.client.guilds:
-            await self.check_guild(guild)
+    async def check_guilds(self, concurrency: int = SWEEP_GUILD_CONCURRENCY):
+        semaphore = asyncio.Semaphore(concurrency)
+        guilds = self.client.guilds
+        start = monotonic()
+
+        async def check(guild: discord.Guild):
+            async with semaphore:
+                await self.check_guild(guild)
+
+        results = await asyncio.gather(
+            *(check(guild) for guild in guilds), return_exceptions=True
+        )
+        for guild, result in zip(guilds, results):
+            if isinstance(result, Exception):
+                print(f"Failed to check guild {guild.id}: {result}")
+        print(f"Checked {len(results)} guilds in {monotonic() - start:.1f}s")
 
     async def setup_guild(self, guild: discord.Guild):
         self.tree.copy_global_to(guild=guild)
@@ -172,70 +584,116 @@ class BotUtils:
             f"Synced {len(commands)} commands: {', '.join([c.name for c in commands])}"
         )
 
-    async def purge_user_app_ids(self):
-        apps = self.settings.get(enums.SettingsKeys.APPS)
-        user_apps = self.settings.get(enums.SettingsKeys.USER_APPS)
-        sanitized = {}
-        for user_id, value in user_apps.items():
-            result = {}
-            for app_id, info in value.items():
-                # Remove app ids that are already known
-                if str(app_id) in apps:
-                    print(f"Deleted known user app ID {app_id} for user {user_id}")
-                    continue
-
-                # Remove app ids that are past their max age
-                parsed_info = objects.UserApp(**info)
-                print("parsed_info", parsed_info)
-                if parsed_info.timestamp + MAX_USER_APP_ID_RETENTION < int(time()):
-                    print(f"Deleted expired user app ID {app_id} for user {user_id}")
-                    continue
-
-                result[str(app_id)] = info
-
-            if len(result) > 0:
-                sanitized[user_id] = result
-
-        self.settings.set(enums.SettingsKeys.USER_APPS, sanitized)
-
-    async def update_apps(self):
-        result = {str(MUSIC_APP_ID): True, str(PODCAST_APP_ID): True}
+    async def purge_user_app_ids(self, known_app_ids: Iterable[int]) -> set[int]:
+        changed = set()
+        # Remove app ids that are known now, looked up by app
+        # so the registered apps of all users are never scanned
+        for app_id in known_app_ids:
+            for user_id in self.user_apps.remove_app(app_id):
+                print(f"Deleted known user app ID {app_id} for user {user_id}")
+                changed.add(user_id)
+
+        # Remove app ids that are past their max age
+        expired = self.user_apps.expire(int(time()) - MAX_USER_APP_ID_RETENTION)
+        for user_id, app_id in expired:
+            print(f"Deleted expired user app ID {app_id} for user {user_id}")
+            changed.add(user_id)
+
+        for user_id in changed:
+            self.save_user_apps(user_id)
+        return changed
+
+    async def update_apps(self) -> set[int] | None:
+        """
+        Downloads the players list if it changed and returns the app IDs
+        that were added or removed, or None if the download failed.
+        """
+        try:
+            players, validators = await fetch_players(
+                self.http, self.players_url, self.players_cache.validators
+            )
+        except Exception as e:
+            print(f"Failed to download players from {self.players_url}: {e}")
+            return None
 
-        # TODO clean this up
-        async with aiohttp.ClientSession() as session:
-            async with session.get(PLAYERS_JSON_URL) as response:
-                if response.status != 200:
-                    print("failed to download players from", PLAYERS_JSON_URL)
-                    return
+        self.players_cache.update(players, validators)
+        if players is None:
+            print("Application IDs are unchanged (not modified)")
+            return set()
 
-                players = json.loads(await response.read())
-                for player in players["players"]:
-                    if (
-                        "extra" in player
-                        and "discord_application_id" in player["extra"]
-                    ):
-                        app_id = player["extra"]["discord_application_id"]
-                        result[str(app_id)] = True
-                    else:
-                        print("player", player, "does not have a discord app id")
+        app_ids = {MUSIC_APP_ID, PODCAST_APP_ID} | discord_app_ids(players)
+        changed = app_ids ^ self.known_app_ids
+        if changed:
+            self.settings.set(
+                enums.SettingsKeys.APPS, {str(app_id): True for app_id in app_ids}
+            )
+            self.known_app_ids = frozenset(app_ids)
+        print(
+            f"Updated application IDs ({len(app_ids)} entries, {len(changed)} changed)"
+        )
+        return changed
 
-        self.settings.set(enums.SettingsKeys.APPS, result)
-        print(f"Updated application IDs ({len(result)} entries)")
-        await self.purge_user_app_ids()
+    async def check_app_members(
+        self, app_ids: set[int], user_ids: set[int] = frozenset()
+    ):
+        # Only members with one of these apps in their activities, or whose
+        # registered apps changed, can be affected.
+        checked = 0
+        for guild in self.client.guilds:
+            if not self.listener_roles.get(guild.id):
+                continue
+            for member in self.get_sweep_candidates(guild):
+                if member.id not in user_ids and not any(
+                    isinstance(activity, discord.Activity)
+                    and activity.application_id in app_ids
+                    for activity in member.activities
+                ):
+                    continue
+                await self.sweep_member(member)
+                checked += 1
+                if checked % SWEEP_YIELD_INTERVAL == 0:
+                    await asyncio.sleep(0)
+        print(f"Checked {checked} members using changed application IDs")
 
     async def update_apps_periodically(self):
+        # Start with the application IDs from the last download, however old
+        # they are, and download them again in the background when due.
+        await self.purge_user_app_ids(self.known_app_ids)
+        await self.check_guilds()
+
+        failures = 0
         while True:
+            due = PLAYERS_REFRESH_INTERVAL - self.players_cache.age()
+            if due > 0:
+                await asyncio.sleep(due)
+
             print("Updating application IDs")
-            await self.update_apps()
-            await self.check_guilds()
-            await asyncio.sleep(60 * 60 * 8)
+            changed = await self.update_apps()
+            if changed is None:
+                delay = retry_delay(failures)
+                failures += 1
+                print(f"Retrying to update application IDs in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            failures = 0
+            if changed:
+                user_ids = await self.purge_user_app_ids(changed & self.known_app_ids)
+                await self.check_app_members(changed, user_ids)
+            print(f"Presence queue: {self.presence_queue.stats()}")
+            print(f"Role changes: {self.role_scheduler.stats()}")
+            print(f"HTTP: {self.http.stats()}")
+            print(f"Autolog replies: {self.autolog_throttle.stats()}")
+            print(f"Autolog patterns: {self.autolog_matchers.stats()}")
+            if isinstance(self.settings, JournalSettings):
+                print(f"Settings: {self.settings.stats()}")
 
     def get_role_overview(self, guild: discord.Guild) -> str | None:
-        if not self.settings.dexists(enums.SettingsKeys.ROLES, str(guild.id)):
+        guild_roles = self.get_guild_config(guild.id).listener_roles
+        if guild_roles is None:
             return None
 
         inverse = defaultdict(list)
-        guild_roles = self.settings.dget(enums.SettingsKeys.ROLES, str(guild.id))
         for for_role_id, listener_role_id in guild_roles.items():
             inverse[listener_role_id].append(for_role_id)
 
@@ -306,7 +764,7 @@ class BotUtils:
         await interaction.response.send_message(self.logs_response(platform))
 
     async def get_download_urls(self) -> list[tuple[str, str]]:
-        version = await latest_github_release_version()
+        version = await latest_github_release_version(self.http)
         return [
             (name, url.format(version=version))
             for name, url in HELP_DOWNLOAD_URLS_FORMAT
@@ -329,43 +787,101 @@ class BotUtils:
         ]
         
     def get_platform_names(self, guild: discord.Guild) -> list[str]:
-        guild_id = str(guild.id)
-        if not self.settings.dexists(
-            enums.SettingsKeys.SPONSOR_PLATFORMS, guild_id
-        ):
-            return []
-        platforms = self.settings.dget(
-            enums.SettingsKeys.SPONSOR_PLATFORMS, guild_id
-        )
-        return list(platforms.keys())
+        return list(self.get_guild_config(guild.id).sponsor_platforms)
 
     def search_platforms(self, guild: discord.Guild, query: str) -> list[str]:
         return [
             name
             for name in self.get_platform_names(guild)
             if query.lower() in name.lower()
-        ]   
-    def get_sponsor_status(self, member: discord.Member):
-        guild_id = str(member.guild.id)
+        ]
 
-        if not self.settings.dexists(enums.SettingsKeys.SPONSOR_ROLES, guild_id):
-            return None
+    def save_sponsor_platforms(self, config: objects.GuildConfig):
+        guild_id = str(config.guild_id)
+        self.settings.dadd(
+            enums.SettingsKeys.SPONSOR_PLATFORMS,
+            (guild_id, config.sponsor_platforms_setting()),
+        )
+        self.settings.dadd(
+            enums.SettingsKeys.SPONSOR_PLATFORM_ROLES,
+            (guild_id, config.sponsor_platform_roles_setting()),
+        )
+
+    def add_sponsor_platform(
+        self,
+        guild: discord.Guild,
+        name: str,
+        emoji: str,
+        role: discord.Role,
+        url: str | None = None,
+    ):
+        config = self.get_guild_config(guild.id)
+        config.sponsor_platforms[name] = objects.SponsorPlatform(emoji, url)
+        config.sponsor_platform_roles[role.id] = name
+        self.save_sponsor_platforms(config)
 
-        roles_cfg = self.settings.dget(
-            enums.SettingsKeys.SPONSOR_ROLES, guild_id
+    def edit_sponsor_platform(
+        self,
+        guild: discord.Guild,
+        name: str,
+        emoji: str | None = None,
+        role: discord.Role | None = None,
+        url: str | None = None,
+    ) -> bool:
+        config = self.get_guild_config(guild.id)
+        platform = config.sponsor_platforms.get(name)
+        if platform is None:
+            return False
+
+        if emoji:
+            platform.emoji = emoji
+        if url is not None:
+            platform.url = url  # allow clearing with empty string
+        if role is not None:
+            for role_id in config.platform_role_ids(name):
+                del config.sponsor_platform_roles[role_id]
+            config.sponsor_platform_roles[role.id] = name
+        self.save_sponsor_platforms(config)
+        return True
+
+    def delete_sponsor_platform(self, guild: discord.Guild, name: str) -> bool:
+        config = self.get_guild_config(guild.id)
+        if name not in config.sponsor_platforms:
+            return False
+
+        del config.sponsor_platforms[name]
+        for role_id in config.platform_role_ids(name):
+            del config.sponsor_platform_roles[role_id]
+        self.save_sponsor_platforms(config)
+        return True
+
+    def set_sponsor_roles(
+        self,
+        guild: discord.Guild,
+        monthly_role: discord.Role | None = None,
+        normal_role: discord.Role | None = None,
+    ):
+        config = self.get_guild_config(guild.id)
+        if monthly_role:
+            config.sponsor_monthly_role_id = monthly_role.id
+        if normal_role:
+            config.sponsor_normal_role_id = normal_role.id
+        self.settings.dadd(
+            enums.SettingsKeys.SPONSOR_ROLES,
+            (str(guild.id), config.sponsor_roles_setting()),
         )
 
-        status = None
-        monthly_id = roles_cfg.get("monthly")
-        one_time_id = roles_cfg.get("normal")
+    def get_sponsor_status(self, member: discord.Member):
+        config = self.get_guild_config(member.guild.id)
 
-        if monthly_id:
-            role = member.guild.get_role(int(monthly_id))
+        status = None
+        if config.sponsor_monthly_role_id:
+            role = member.guild.get_role(config.sponsor_monthly_role_id)
             if role and role in member.roles:
                 status = "subscription"
 
-        if status is None and one_time_id:
-            role = member.guild.get_role(int(one_time_id))
+        if status is None and config.sponsor_normal_role_id:
+            role = member.guild.get_role(config.sponsor_normal_role_id)
             if role and role in member.roles:
                 status = "one-time"
 
@@ -373,65 +889,36 @@ class BotUtils:
             return None
 
         platform_entries = []
-
-        if self.settings.dexists(enums.SettingsKeys.SPONSOR_PLATFORM_ROLES, guild_id):
-            role_map = self.settings.dget(
-                enums.SettingsKeys.SPONSOR_PLATFORM_ROLES, guild_id
-            )
-            for role_id_str, name in role_map.items():
-                role = member.guild.get_role(int(role_id_str))
-                if role and role in member.roles:
-                    emoji = None
-                    if self.settings.dexists(
-                        enums.SettingsKeys.SPONSOR_PLATFORMS, guild_id
-                    ):
-                        platforms = self.settings.dget(
-                            enums.SettingsKeys.SPONSOR_PLATFORMS, guild_id
-                        )
-                        emoji = platforms.get(name)
-                    platform_entries.append({
-                        "name": name,
-                        "emoji": emoji.get("emoji") if isinstance(emoji, dict) else emoji,
-                        "url": emoji.get("url") if isinstance(emoji, dict) else None
-                    })
+        for role_id, name in config.sponsor_platform_roles.items():
+            role = member.guild.get_role(role_id)
+            if role and role in member.roles:
+                platform = config.sponsor_platforms.get(name)
+                platform_entries.append({
+                    "name": name,
+                    "emoji": platform.emoji if platform else None,
+                    "url": platform.url if platform else None,
+                })
 
         return {
             "type": status,
             "platforms": platform_entries
         }
-    def get_platform_overview(self, guild: discord.Guild) -> str | None:
-        guild_id = str(guild.id)
-
-        if not self.settings.dexists(enums.SettingsKeys.SPONSOR_PLATFORMS, guild_id):
-            return None
 
-        platforms = self.settings.dget(enums.SettingsKeys.SPONSOR_PLATFORMS, guild_id)
-        role_map = (
-            self.settings.dget(enums.SettingsKeys.SPONSOR_PLATFORM_ROLES, guild_id)
-            if self.settings.dexists(enums.SettingsKeys.SPONSOR_PLATFORM_ROLES, guild_id)
-            else {}
-        )
+    def get_platform_overview(self, guild: discord.Guild) -> str | None:
+        config = self.get_guild_config(guild.id)
 
         lines = []
-        for name, data in platforms.items():
-            # Handle legacy string entries
-            if isinstance(data, str):
-                emoji = data
-                url = None
-            else:
-                emoji = data.get("emoji", "")
-                url = data.get("url")
-
+        for name, platform in config.sponsor_platforms.items():
             role_ids = [
-                int(rid)
-                for rid, plat in role_map.items()
-                if plat == name and guild.get_role(int(rid)) is not None
+                role_id
+                for role_id in config.platform_role_ids(name)
+                if guild.get_role(role_id) is not None
             ]
             role_mentions = ", ".join(f"<@&{rid}>" for rid in role_ids) if role_ids else ""
 
-            line = f"- {emoji} `{name}`"
-            if url:
-                line += f" ([link]({url}))"
+            line = f"- {platform.emoji} `{name}`"
+            if platform.url:
+                line += f" ([link]({platform.url}))"
             if role_mentions:
                 line += f" -> {role_mentions}"
 
@@ -440,17 +927,16 @@ class BotUtils:
         return "\n".join(lines) if lines else None
 
     def get_sponsor_list(self, guild: discord.Guild) -> str | None:
-        guild_id = str(guild.id)
-
-        if not self.settings.dexists(enums.SettingsKeys.SPONSOR_ROLES, guild_id):
-            return None
-
-        roles_cfg = self.settings.dget(enums.SettingsKeys.SPONSOR_ROLES, guild_id)
+        config = self.get_guild_config(guild.id)
         monthly_role = (
-            guild.get_role(int(roles_cfg.get("monthly"))) if roles_cfg.get("monthly") else None
+            guild.get_role(config.sponsor_monthly_role_id)
+            if config.sponsor_monthly_role_id
+            else None
         )
         normal_role = (
-            guild.get_role(int(roles_cfg.get("normal"))) if roles_cfg.get("normal") else None
+            guild.get_role(config.sponsor_normal_role_id)
+            if config.sponsor_normal_role_id
+            else None
         )
 
         lines = []
@@ -466,11 +952,113 @@ class BotUtils:
 
         return "\n".join(lines) if lines else None
     
-    async def autolog(self, message: discord.Message):
-        is_channel_observed = self.settings.lexists(
-            enums.SettingsKeys.AUTOLOG, f"{message.guild.id}:{message.channel.id}"
+    def load_observed_channels(self):
+        self.observed_channels = set()
+        for channel_value in self.settings.get(enums.SettingsKeys.AUTOLOG):
+            guild_id, channel_id = channel_value.split(":")
+            self.observed_channels.add((int(guild_id), int(channel_id)))
+
+    def is_channel_observed(self, message: discord.Message) -> bool:
+        return (
+            message.guild is not None
+            and (message.guild.id, message.channel.id) in self.observed_channels
         )
-        if is_channel_observed and LogRequestMatcher().test(message.content):
+
+    def load_autolog_patterns(self):
+        self.autolog_patterns = {
+            int(guild_id): tuple(patterns)
+            for guild_id, patterns in self.settings.get(
+                enums.SettingsKeys.AUTOLOG_PATTERNS
+            ).items()
+        }
+        for guild_id, patterns in self.autolog_patterns.items():
+            if len(self.autolog_matchers) >= AUTOLOG_MATCHER_CACHE_SIZE:
+                break
+            self.compile_autolog_patterns(guild_id, patterns)
+
+    def compile_autolog_patterns(
+        self, guild_id: int, patterns: tuple[str, ...]
+    ) -> objects.AutologPatternMatcher:
+        matcher = objects.AutologPatternMatcher(patterns, AUTOLOG_PATTERN_MAX_INPUT)
+        self.autolog_matchers.put(guild_id, matcher)
+        return matcher
+
+    async def get_autolog_matcher(
+        self, guild_id: int
+    ) -> objects.AutologPatternMatcher | None:
+        patterns = self.autolog_patterns.get(guild_id)
+        if not patterns:
+            return None
+        matcher = self.autolog_matchers.get(guild_id)
+        if matcher is None or matcher.patterns != patterns:
+            # dropped from the cache, compiled without blocking other events
+            matcher = await asyncio.to_thread(
+                objects.AutologPatternMatcher, patterns, AUTOLOG_PATTERN_MAX_INPUT
+            )
+            if self.autolog_patterns.get(guild_id) == patterns:
+                self.autolog_matchers.put(guild_id, matcher)
+        return matcher
+
+    def save_autolog_patterns(self, guild_id: int, patterns: tuple[str, ...]):
+        self.autolog_matchers.invalidate(guild_id)
+        if patterns:
+            self.autolog_patterns[guild_id] = patterns
+            self.settings.dadd(
+                enums.SettingsKeys.AUTOLOG_PATTERNS, (str(guild_id), list(patterns))
+            )
+            self.compile_autolog_patterns(guild_id, patterns)
+        else:
+            self.autolog_patterns.pop(guild_id, None)
+            key = enums.SettingsKeys.AUTOLOG_PATTERNS
+            if self.settings.dexists(key, str(guild_id)):
+                self.settings.dpop(key, str(guild_id))
+
+    def add_autolog_pattern(self, guild_id: int, pattern: str) -> str:
+        patterns = self.autolog_patterns.get(guild_id, ())
+        if pattern in patterns:
+            return f"The pattern `{pattern}` already exists. Nothing to do."
+        if len(patterns) >= AUTOLOG_MAX_PATTERNS:
+            return f"A server can have at most {AUTOLOG_MAX_PATTERNS} patterns."
+        if len(pattern) > AUTOLOG_PATTERN_MAX_LENGTH:
+            return (
+                f"Patterns can be at most {AUTOLOG_PATTERN_MAX_LENGTH} characters long."
+            )
+        try:
+            objects.compile_autolog_pattern(pattern)
+        except objects.InvalidAutologPattern as e:
+            return f"The pattern `{pattern}` is invalid: {e}"
+
+        self.save_autolog_patterns(guild_id, patterns + (pattern,))
+        return f"Added the pattern `{pattern}`."
+
+    def remove_autolog_pattern(self, guild_id: int, pattern: str) -> str:
+        patterns = self.autolog_patterns.get(guild_id, ())
+        if pattern not in patterns:
+            return f"The pattern `{pattern}` does not exist. Nothing to do."
+
+        self.save_autolog_patterns(
+            guild_id, tuple(p for p in patterns if p != pattern)
+        )
+        return f"Removed the pattern `{pattern}`."
+
+    def list_autolog_patterns(self, guild_id: int) -> str:
+        patterns = self.autolog_patterns.get(guild_id)
+        if not patterns:
+            return "This server has no custom patterns."
+        return "\n".join(f"- `{pattern}`" for pattern in patterns)
+
+    async def is_log_request(self, message: discord.Message) -> bool:
+        if self.log_request_matcher.test(message.content):
+            return True
+        matcher = await self.get_autolog_matcher(message.guild.id)
+        return matcher is not None and matcher.test(message.content)
+
+    async def autolog(self, message: discord.Message):
+        if not self.is_channel_observed(message):
+            return
+        if not await self.is_log_request(message):
+            return
+        if self.autolog_throttle.allow(message.channel.id, message.author.id):
             await message.reply(self.logs_response())
 
     def autolog_command(
@@ -478,13 +1066,13 @@ class BotUtils:
     ) -> str | None:
         if channel is not None:
             channel_value = f"{channel.guild.id}:{channel.id}"
-            is_channel_observed = self.settings.lexists(
-                enums.SettingsKeys.AUTOLOG, channel_value
-            )
+            channel_key = (channel.guild.id, channel.id)
+            is_channel_observed = channel_key in self.observed_channels
 
             if state is enums.AutologState.ON:
                 if not is_channel_observed:
                     self.settings.ladd(enums.SettingsKeys.AUTOLOG, channel_value)
+                    self.observed_channels.add(channel_key)
                     return f"The channel <#{channel.id}> is now observed."
                 if is_channel_observed:
                     return f"The channel <#{channel.id}> is already observed. Nothing to do."
@@ -492,6 +1080,7 @@ class BotUtils:
             if state is enums.AutologState.OFF:
                 if is_channel_observed:
                     self.settings.lremvalue(enums.SettingsKeys.AUTOLOG, channel_value)
+                    self.observed_channels.discard(channel_key)
                     return f"The channel <#{channel.id}> is no longer observed."
                 if not is_channel_observed:
                     return f"The channel <#{channel.id}> is currently unobserved. Nothing to do."
@@ -500,4 +1089,5 @@ class BotUtils:
             if self.settings.exists(enums.SettingsKeys.AUTOLOG):
                 self.settings.lremlist(enums.SettingsKeys.AUTOLOG)
                 self.settings.lcreate(enums.SettingsKeys.AUTOLOG)
+            self.observed_channels.clear()
             return f"All channels were removed from observation."
@@ -0,0 +1,121 @@
+import aiohttp
+
+from dataclasses import dataclass
+from time import monotonic
+from urllib.parse import urlsplit
+
+from multidict import CIMultiDictProxy
+
+from enums.constants import (
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_CONNECTIONS_PER_HOST,
+    HTTP_KEEPALIVE_TIMEOUT,
+    HTTP_MAX_RESPONSE_SIZE,
+    HTTP_READ_TIMEOUT,
+    HTTP_TOTAL_TIMEOUT,
+)
+
+
+class ResponseTooLarge(Exception):
+    pass
+
+
+@dataclass
+class HttpResponse:
+    status: int
+    headers: CIMultiDictProxy[str]
+    body: bytes
+
+
+@dataclass
+class UpstreamStats:
+    requests: int = 0
+    errors: int = 0
+    total_latency: float = 0.0
+    max_latency: float = 0.0
+
+    def __str__(self) -> str:
+        average = self.total_latency / self.requests if self.requests else 0
+        return (
+            f"{self.requests} requests, {self.errors} errors, "
+            f"{average * 1000:.0f}ms avg, {self.max_latency * 1000:.0f}ms max"
+        )
+
+
+class HttpClient:
+    """
+    The HTTP client for all outgoing requests other than Discord's. It keeps
+    connections alive between requests, limits the connections per host,
+    times out stalled requests and refuses overly large responses.
+    Use it with async with, or call close() when done.
+    """
+
+    def __init__(
+        self,
+        connections_per_host: int = HTTP_CONNECTIONS_PER_HOST,
+        max_response_size: int = HTTP_MAX_RESPONSE_SIZE,
+    ):
+        self.connections_per_host = connections_per_host
+        self.max_response_size = max_response_size
+        self.session: aiohttp.ClientSession | None = None
+        # host -> stats
+        self.upstreams: dict[str, UpstreamStats] = {}
+
+    def _session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit_per_host=self.connections_per_host,
+                    keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+                ),
+                timeout=aiohttp.ClientTimeout(
+                    total=HTTP_TOTAL_TIMEOUT,
+                    connect=HTTP_CONNECT_TIMEOUT,
+                    sock_read=HTTP_READ_TIMEOUT,
+                ),
+            )
+        return self.session
+
+    async def __aenter__(self) -> "HttpClient":
+        self._session()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def get(self, url: str, headers: dict[str, str] | None = None) -> HttpResponse:
+        stats = self.upstreams.setdefault(urlsplit(url).netloc, UpstreamStats())
+        stats.requests += 1
+        start = monotonic()
+        try:
+            async with self._session().get(url, headers=headers) as response:
+                if (response.content_length or 0) > self.max_response_size:
+                    raise ResponseTooLarge(
+                        f"{url} responded with {response.content_length} bytes"
+                    )
+                body = bytearray()
+                async for chunk in response.content.iter_chunked(64 * 1024):
+                    body += chunk
+                    if len(body) > self.max_response_size:
+                        raise ResponseTooLarge(
+                            f"{url} responded with more than "
+                            f"{self.max_response_size} bytes"
+                        )
+                if response.status >= 500:
+                    stats.errors += 1
+                return HttpResponse(response.status, response.headers, bytes(body))
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            latency = monotonic() - start
+            stats.total_latency += latency
+            stats.max_latency = max(stats.max_latency, latency)
+
+    def stats(self) -> str:
+        return "; ".join(f"{host}: {stats}" for host, stats in self.upstreams.items())
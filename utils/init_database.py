@@ -1,10 +1,18 @@
-import pickledb
 import sqlite3
 import enums
 
+from utils.settings_journal import JournalSettings
+from utils.settings_sqlite import SqliteSettings
 
-def load_settings_database(version: int = 0) -> pickledb.PickleDB:
-    settings = pickledb.load(f"settings.{version}.db", True)
+
+def load_settings_database(
+    version: int = 0,
+    backend: enums.SettingsBackend = enums.SettingsBackend.JOURNAL,
+) -> JournalSettings | SqliteSettings:
+    if backend is enums.SettingsBackend.SQLITE:
+        settings = SqliteSettings(f"settings.{version}.sqlite3")
+    else:
+        settings = JournalSettings(f"settings.{version}.db")
 
     for key in [
         enums.SettingsKeys.ROLES,
@@ -13,6 +21,7 @@ def load_settings_database(version: int = 0) -> pickledb.PickleDB:
         enums.SettingsKeys.SPONSOR_PLATFORMS,
         enums.SettingsKeys.SPONSOR_ROLES,
         enums.SettingsKeys.SPONSOR_PLATFORM_ROLES,
+        enums.SettingsKeys.AUTOLOG_PATTERNS,
     ]:
         if not settings.exists(key):
             settings.dcreate(key)
@@ -0,0 +1,127 @@
+import json
+import os
+import random
+
+from time import time
+
+from enums.constants import (
+    MUSIC_APP_ID,
+    PLAYERS_RETRY_BASE,
+    PLAYERS_RETRY_MAX,
+    PODCAST_APP_ID,
+)
+
+from utils.http_client import HttpClient
+
+CACHE_VERSION = 1
+
+
+def conditional_headers(validators: dict[str, str]) -> dict[str, str]:
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    return headers
+
+
+async def fetch_players(
+    http: HttpClient, url: str, validators: dict[str, str]
+) -> tuple[dict | None, dict[str, str]]:
+    """
+    Downloads the players list unless it did not change since the response
+    the validators (ETag and Last-Modified) were taken from. Returns None
+    and the same validators when it did not change.
+    """
+    response = await http.get(url, headers=conditional_headers(validators))
+    if response.status == 304:
+        return None, validators
+    if response.status != 200:
+        raise RuntimeError(f"Failed to download players: HTTP {response.status}")
+
+    players = json.loads(response.body)
+    validators = {}
+    if "ETag" in response.headers:
+        validators["etag"] = response.headers["ETag"]
+    if "Last-Modified" in response.headers:
+        validators["last_modified"] = response.headers["Last-Modified"]
+    return players, validators
+
+
+def discord_app_ids(players: dict) -> set[int]:
+    app_ids = set()
+    for player in players["players"]:
+        if "extra" in player and "discord_application_id" in player["extra"]:
+            app_ids.add(int(player["extra"]["discord_application_id"]))
+        else:
+            print("player", player, "does not have a discord app id")
+    return app_ids
+
+
+def retry_delay(failures: int) -> float:
+    # Full jitter, so restarted instances do not retry in lockstep
+    return random.uniform(0, min(PLAYERS_RETRY_MAX, PLAYERS_RETRY_BASE * 2**failures))
+
+
+class PlayersCache:
+    """
+    The last downloaded players list with the time it was downloaded or
+    confirmed to be unchanged, and the validators for the next request.
+    It is kept in a file, so the bot can start without downloading it.
+    """
+
+    def __init__(self, location: str):
+        self.location = location
+        self.players: dict | None = None
+        self.validators: dict[str, str] = {}
+        self.fetched_at = 0.0
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.location):
+            return
+        try:
+            with open(self.location, "rt") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Ignoring unreadable players cache {self.location}: {e}")
+            return
+        if data.get("version") != CACHE_VERSION:
+            print(f"Ignoring players cache with version {data.get('version')}")
+            return
+        self.players = data["players"]
+        self.validators = data["validators"]
+        self.fetched_at = data["fetched_at"]
+
+    def save(self):
+        temp_location = self.location + ".tmp"
+        with open(temp_location, "wt") as f:
+            json.dump(
+                {
+                    "version": CACHE_VERSION,
+                    "fetched_at": self.fetched_at,
+                    "validators": self.validators,
+                    "players": self.players,
+                },
+                f,
+            )
+        os.replace(temp_location, self.location)
+
+    def update(self, players: dict | None, validators: dict[str, str]):
+        """
+        Stores a new players list, or marks the current one as up to date
+        when players is None.
+        """
+        if players is not None:
+            self.players = players
+        self.validators = validators
+        self.fetched_at = time()
+        self.save()
+
+    def age(self) -> float:
+        return time() - self.fetched_at
+
+    def app_ids(self) -> set[int] | None:
+        if self.players is None:
+            return None
+        return {MUSIC_APP_ID, PODCAST_APP_ID} | discord_app_ids(self.players)
@@ -0,0 +1,225 @@
+import json
+import os
+import threading
+
+from collections.abc import Iterator
+from time import monotonic
+from typing import Any
+
+FLUSH_INTERVAL = 5.0
+JOURNAL_SUFFIX = ".journal"
+# the journal while its records are written to a new snapshot
+COMPACTING_SUFFIX = ".journal.compacting"
+
+
+def iter_journal(location: str) -> Iterator[list]:
+    with open(location, "rt") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # the last record was not written completely
+                break
+
+
+def apply_record(db: dict[str, Any], op: str, name: str, *args):
+    if op == "set":
+        db[name] = args[0]
+    elif op == "del":
+        db.pop(name, None)
+    elif op == "dset":
+        db.setdefault(name, {})[args[0]] = args[1]
+    elif op == "ddel":
+        db.get(name, {}).pop(args[0], None)
+
+
+class JournalSettings:
+    """
+    Settings with the same interface as the parts of pickledb that the bot
+    uses. The data is kept in memory, every change is appended to a journal
+    file and changes are written to a new snapshot in the background, at
+    most once per flush interval.
+
+    The snapshot has the same format as a pickledb file. It is written to a
+    temporary file which is synced and renamed over the old snapshot, so a
+    crash leaves either the old or the new snapshot. Each journal record
+    holds the new value of whatever it changed, so replaying records that
+    are already part of the snapshot does no harm.
+    """
+
+    def __init__(self, location: str, flush_interval: float = FLUSH_INTERVAL):
+        self.location = os.path.expanduser(location)
+        self.journal_location = self.location + JOURNAL_SUFFIX
+        self.compacting_location = self.location + COMPACTING_SUFFIX
+        self.flush_interval = flush_interval
+        # Held while changing the data or journal, the snapshot is written
+        # outside of it. flush_lock makes sure only one snapshot is written.
+        self.lock = threading.RLock()
+        self.flush_lock = threading.Lock()
+        self.timer: threading.Timer | None = None
+        self.records = 0
+        self.flushes = 0
+        self.bytes_written = 0
+        self.last_flush = monotonic()
+        self.last_flush_started = self.last_flush
+
+        self.db: dict[str, Any] = {}
+        if os.path.exists(self.location):
+            with open(self.location, "rt") as f:
+                self.db = json.load(f)
+        recovered = self._replay(self.compacting_location)
+        recovered |= self._replay(self.journal_location)
+
+        self.journal = open(self.journal_location, "at")
+        if recovered:
+            # Also gets rid of incomplete records, new ones are appended
+            self.dump()
+
+    def _replay(self, location: str) -> bool:
+        if not os.path.exists(location):
+            return False
+
+        for record in iter_journal(location):
+            apply_record(self.db, *record)
+        return True
+
+    def _record(self, op: str, name: str, *args):
+        self.journal.write(json.dumps([op, str(name), *args]) + "\n")
+        self.journal.flush()
+        self.records += 1
+        if self.timer is None:
+            delay = self.last_flush_started + self.flush_interval - monotonic()
+            self.timer = threading.Timer(max(delay, 0), self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush(self, force: bool = False) -> bool:
+        """
+        Writes a snapshot of the current data and starts a new journal,
+        if anything changed since the last snapshot or force is given.
+        """
+        with self.flush_lock:
+            with self.lock:
+                self.timer = None
+                if self.records == 0 and not force:
+                    return False
+                self.last_flush_started = monotonic()
+                data = json.dumps(self.db).encode()
+                self._rotate_journal()
+
+            self._write_snapshot(data)
+            self.flushes += 1
+            self.bytes_written += len(data)
+            self.last_flush = monotonic()
+            return True
+
+    def _rotate_journal(self):
+        self.journal.close()
+        if os.path.exists(self.compacting_location):
+            # The previous snapshot was not written, keep its records
+            with open(self.compacting_location, "at") as compacting:
+                with open(self.journal_location, "rt") as journal:
+                    compacting.write(journal.read())
+            os.remove(self.journal_location)
+        else:
+            os.replace(self.journal_location, self.compacting_location)
+        self.journal = open(self.journal_location, "at")
+        self.records = 0
+
+    def _write_snapshot(self, data: bytes):
+        temp_location = self.location + ".tmp"
+        with open(temp_location, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_location, self.location)
+        if hasattr(os, "O_DIRECTORY"):
+            # makes the rename itself durable
+            fd = os.open(os.path.dirname(self.location) or ".", os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        os.remove(self.compacting_location)
+
+    def stats(self) -> str:
+        return (
+            f"{monotonic() - self.last_flush:.0f}s since last flush, "
+            f"{self.flushes} flushes, {self.bytes_written} bytes written, "
+            f"{self.records} pending records"
+        )
+
+    def dump(self) -> bool:
+        return self.flush(force=True)
+
+    def close(self):
+        with self.lock:
+            if self.journal.closed:
+                return
+            if self.timer is not None:
+                self.timer.cancel()
+        self.dump()
+        self.journal.close()
+
+    def set(self, key: str, value: Any) -> bool:
+        with self.lock:
+            self.db[key] = value
+            self._record("set", key, value)
+        return True
+
+    def get(self, key: str) -> Any:
+        return self.db.get(key, False)
+
+    def exists(self, key: str) -> bool:
+        return key in self.db
+
+    def rem(self, key: str) -> bool:
+        with self.lock:
+            del self.db[key]
+            self._record("del", key)
+        return True
+
+    def dcreate(self, name: str) -> bool:
+        return self.set(name, {})
+
+    def dadd(self, name: str, pair: tuple[str, Any]) -> bool:
+        key, value = pair
+        with self.lock:
+            self.db[name][key] = value
+            self._record("dset", name, key, value)
+        return True
+
+    def dget(self, name: str, key: str) -> Any:
+        return self.db[name][key]
+
+    def dexists(self, name: str, key: str) -> bool:
+        return key in self.db[name]
+
+    def dpop(self, name: str, key: str) -> Any:
+        with self.lock:
+            value = self.db[name].pop(key)
+            self._record("ddel", name, key)
+        return value
+
+    def lcreate(self, name: str) -> bool:
+        return self.set(name, [])
+
+    def ladd(self, name: str, value: Any) -> bool:
+        with self.lock:
+            self.db[name].append(value)
+            self._record("set", name, self.db[name])
+        return True
+
+    def lexists(self, name: str, value: Any) -> bool:
+        return value in self.db[name]
+
+    def lremvalue(self, name: str, value: Any) -> bool:
+        with self.lock:
+            self.db[name].remove(value)
+            self._record("set", name, self.db[name])
+        return True
+
+    def lremlist(self, name: str) -> int:
+        count = len(self.db[name])
+        self.rem(name)
+        return count
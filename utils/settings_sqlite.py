@@ -0,0 +1,366 @@
+import json
+import sqlite3
+
+from collections.abc import Callable, Iterable
+from typing import Any
+
+import enums
+
+
+class NestedTable:
+    """
+    Stores a settings dict of dicts, e.g. ROLES[guild_id][for_role_id],
+    with one row per inner entry. The outer key is an integer column.
+    """
+
+    def __init__(
+        self,
+        table: str,
+        key_column: str,
+        columns: tuple[str, ...],
+        encode: Callable[[dict], list[tuple]],
+        decode: Callable[[int, list[tuple]], dict],
+    ):
+        self.table = table
+        self.key_column = key_column
+        self.columns = columns
+        self.encode = encode
+        self.decode = decode
+
+
+def encode_sponsor_platforms(platforms: dict) -> list[tuple]:
+    rows = []
+    for name, data in platforms.items():
+        if isinstance(data, str):  # legacy format
+            rows.append((name, data, None))
+        else:
+            rows.append((name, data.get("emoji"), data.get("url")))
+    return rows
+
+
+NESTED_TABLES = {
+    enums.SettingsKeys.ROLES: NestedTable(
+        "guild_roles",
+        "guild_id",
+        ("for_role_id", "listener_role_id"),
+        lambda roles: [(int(k), v) for k, v in roles.items()],
+        lambda _, rows: {str(k): v for k, v in rows},
+    ),
+    enums.SettingsKeys.USER_APPS: NestedTable(
+        "user_apps",
+        "user_id",
+        ("app_id", "timestamp"),
+        lambda apps: [(int(k), v["timestamp"]) for k, v in apps.items()],
+        lambda user_id, rows: {
+            str(app_id): {"app_id": app_id, "user_id": user_id, "timestamp": ts}
+            for app_id, ts in rows
+        },
+    ),
+    enums.SettingsKeys.SPONSOR_ROLES: NestedTable(
+        "sponsor_roles",
+        "guild_id",
+        ("kind", "role_id"),
+        lambda roles: list(roles.items()),
+        lambda _, rows: dict(rows),
+    ),
+    enums.SettingsKeys.SPONSOR_PLATFORMS: NestedTable(
+        "sponsor_platforms",
+        "guild_id",
+        ("name", "emoji", "url"),
+        encode_sponsor_platforms,
+        lambda _, rows: {name: {"emoji": emoji, "url": url} for name, emoji, url in rows},
+    ),
+    enums.SettingsKeys.SPONSOR_PLATFORM_ROLES: NestedTable(
+        "sponsor_platform_roles",
+        "guild_id",
+        ("role_id", "name"),
+        lambda roles: [(int(k), v) for k, v in roles.items()],
+        lambda _, rows: {str(k): v for k, v in rows},
+    ),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries(
+    name TEXT NOT NULL,
+    key INTEGER NOT NULL,
+    PRIMARY KEY(name, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS guild_roles(
+    guild_id INTEGER NOT NULL,
+    for_role_id INTEGER NOT NULL,
+    listener_role_id INTEGER NOT NULL,
+    PRIMARY KEY(guild_id, for_role_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS user_apps(
+    user_id INTEGER NOT NULL,
+    app_id INTEGER NOT NULL,
+    timestamp INTEGER NOT NULL,
+    PRIMARY KEY(user_id, app_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sponsor_roles(
+    guild_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    role_id INTEGER NOT NULL,
+    PRIMARY KEY(guild_id, kind)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sponsor_platforms(
+    guild_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    emoji TEXT,
+    url TEXT,
+    PRIMARY KEY(guild_id, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sponsor_platform_roles(
+    guild_id INTEGER NOT NULL,
+    role_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY(guild_id, role_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS apps(
+    app_id INTEGER PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS autolog_channels(
+    guild_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    PRIMARY KEY(guild_id, channel_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS kv(
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class SqliteSettings:
+    """
+    Settings with the same interface as JournalSettings, stored in SQLite.
+    The known settings keys are kept in their own indexed tables, so reads
+    and writes only touch the rows of a single guild or user. Any other key
+    is stored as JSON.
+    """
+
+    def __init__(self, location: str):
+        self.conn = sqlite3.connect(location)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    # ---------------------------------------------------- nested dicts
+
+    def _nested_get(self, nested: NestedTable, key: int) -> dict:
+        rows = self.conn.execute(
+            f"SELECT {', '.join(nested.columns)} FROM {nested.table} "
+            f"WHERE {nested.key_column}=?",
+            (key,),
+        ).fetchall()
+        return nested.decode(key, rows)
+
+    def _nested_delete(self, name: str, nested: NestedTable, key: int):
+        self.conn.execute(
+            f"DELETE FROM {nested.table} WHERE {nested.key_column}=?", (key,)
+        )
+        self.conn.execute("DELETE FROM entries WHERE name=? AND key=?", (name, key))
+
+    def _nested_put(self, name: str, nested: NestedTable, key: int, value: dict):
+        self._nested_delete(name, nested, key)
+        self.conn.execute("INSERT INTO entries VALUES(?, ?)", (name, key))
+        self._nested_insert(nested, ((key, *row) for row in nested.encode(value)))
+
+    def _nested_insert(self, nested: NestedTable, rows: Iterable[tuple]):
+        placeholders = ", ".join("?" * (len(nested.columns) + 1))
+        self.conn.executemany(
+            f"INSERT INTO {nested.table}({nested.key_column}, "
+            f"{', '.join(nested.columns)}) VALUES({placeholders})",
+            rows,
+        )
+
+    def _nested_keys(self, name: str) -> list[int]:
+        rows = self.conn.execute("SELECT key FROM entries WHERE name=?", (name,))
+        return [key for (key,) in rows]
+
+    # ---------------------------------------------------- generic JSON values
+
+    def _kv_get(self, name: str) -> Any:
+        row = self.conn.execute("SELECT value FROM kv WHERE name=?", (name,)).fetchone()
+        return json.loads(row[0]) if row is not None else False
+
+    def _kv_set(self, name: str, value: Any):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO kv VALUES(?, ?)", (name, json.dumps(value))
+        )
+
+    # ---------------------------------------------------- pickledb interface
+
+    def exists(self, key: str) -> bool:
+        if key in NESTED_TABLES or key in (
+            enums.SettingsKeys.APPS,
+            enums.SettingsKeys.AUTOLOG,
+        ):
+            return True
+        row = self.conn.execute("SELECT 1 FROM kv WHERE name=?", (key,)).fetchone()
+        return row is not None
+
+    def get(self, key: str) -> Any:
+        if key in NESTED_TABLES:
+            nested = NESTED_TABLES[key]
+            return {
+                str(k): self._nested_get(nested, k) for k in self._nested_keys(key)
+            }
+        if key == enums.SettingsKeys.APPS:
+            rows = self.conn.execute("SELECT app_id FROM apps")
+            return {str(app_id): True for (app_id,) in rows}
+        if key == enums.SettingsKeys.AUTOLOG:
+            rows = self.conn.execute("SELECT guild_id, channel_id FROM autolog_channels")
+            return [f"{guild_id}:{channel_id}" for guild_id, channel_id in rows]
+        return self._kv_get(key)
+
+    def set(self, key: str, value: Any) -> bool:
+        with self.conn:
+            self._clear(key)
+            if key in NESTED_TABLES:
+                nested = NESTED_TABLES[key]
+                self.conn.executemany(
+                    "INSERT INTO entries VALUES(?, ?)", ((key, int(k)) for k in value)
+                )
+                self._nested_insert(
+                    nested,
+                    (
+                        (int(k), *row)
+                        for k, v in value.items()
+                        for row in nested.encode(v)
+                    ),
+                )
+            elif key == enums.SettingsKeys.APPS:
+                self.conn.executemany(
+                    "INSERT INTO apps VALUES(?)", [(int(k),) for k in value]
+                )
+            elif key == enums.SettingsKeys.AUTOLOG:
+                for channel in value:
+                    self._autolog_add(channel)
+            else:
+                self._kv_set(key, value)
+        return True
+
+    def _clear(self, key: str):
+        if key in NESTED_TABLES:
+            self.conn.execute(f"DELETE FROM {NESTED_TABLES[key].table}")
+            self.conn.execute("DELETE FROM entries WHERE name=?", (key,))
+        elif key == enums.SettingsKeys.APPS:
+            self.conn.execute("DELETE FROM apps")
+        elif key == enums.SettingsKeys.AUTOLOG:
+            self.conn.execute("DELETE FROM autolog_channels")
+        else:
+            self.conn.execute("DELETE FROM kv WHERE name=?", (key,))
+
+    def rem(self, key: str) -> bool:
+        with self.conn:
+            self._clear(key)
+        return True
+
+    def dcreate(self, name: str) -> bool:
+        return self.set(name, {})
+
+    def dadd(self, name: str, pair: tuple[str, Any]) -> bool:
+        key, value = pair
+        with self.conn:
+            if name in NESTED_TABLES:
+                self._nested_put(name, NESTED_TABLES[name], int(key), value)
+            elif name == enums.SettingsKeys.APPS:
+                self.conn.execute("INSERT OR IGNORE INTO apps VALUES(?)", (int(key),))
+            else:
+                data = self._kv_get(name)
+                data[key] = value
+                self._kv_set(name, data)
+        return True
+
+    def dget(self, name: str, key: str) -> Any:
+        if name in NESTED_TABLES:
+            if not self.dexists(name, key):
+                raise KeyError(key)
+            return self._nested_get(NESTED_TABLES[name], int(key))
+        if name == enums.SettingsKeys.APPS:
+            if not self.dexists(name, key):
+                raise KeyError(key)
+            return True
+        return self._kv_get(name)[key]
+
+    def dexists(self, name: str, key: str) -> bool:
+        if name in NESTED_TABLES:
+            row = self.conn.execute(
+                "SELECT 1 FROM entries WHERE name=? AND key=?", (name, int(key))
+            ).fetchone()
+            return row is not None
+        if name == enums.SettingsKeys.APPS:
+            row = self.conn.execute(
+                "SELECT 1 FROM apps WHERE app_id=?", (int(key),)
+            ).fetchone()
+            return row is not None
+        return key in self._kv_get(name)
+
+    def dpop(self, name: str, key: str) -> Any:
+        value = self.dget(name, key)
+        with self.conn:
+            if name in NESTED_TABLES:
+                self._nested_delete(name, NESTED_TABLES[name], int(key))
+            elif name == enums.SettingsKeys.APPS:
+                self.conn.execute("DELETE FROM apps WHERE app_id=?", (int(key),))
+            else:
+                data = self._kv_get(name)
+                del data[key]
+                self._kv_set(name, data)
+        return value
+
+    def _autolog_add(self, channel: str):
+        guild_id, channel_id = channel.split(":")
+        self.conn.execute(
+            "INSERT OR IGNORE INTO autolog_channels VALUES(?, ?)",
+            (int(guild_id), int(channel_id)),
+        )
+
+    def lcreate(self, name: str) -> bool:
+        return self.set(name, [])
+
+    def ladd(self, name: str, value: Any) -> bool:
+        with self.conn:
+            if name == enums.SettingsKeys.AUTOLOG:
+                self._autolog_add(value)
+            else:
+                self._kv_set(name, self._kv_get(name) + [value])
+        return True
+
+    def lexists(self, name: str, value: Any) -> bool:
+        if name == enums.SettingsKeys.AUTOLOG:
+            guild_id, channel_id = value.split(":")
+            row = self.conn.execute(
+                "SELECT 1 FROM autolog_channels WHERE guild_id=? AND channel_id=?",
+                (int(guild_id), int(channel_id)),
+            ).fetchone()
+            return row is not None
+        return value in self._kv_get(name)
+
+    def lremvalue(self, name: str, value: Any) -> bool:
+        with self.conn:
+            if name == enums.SettingsKeys.AUTOLOG:
+                guild_id, channel_id = value.split(":")
+                self.conn.execute(
+                    "DELETE FROM autolog_channels WHERE guild_id=? AND channel_id=?",
+                    (int(guild_id), int(channel_id)),
+                )
+            else:
+                data = self._kv_get(name)
+                data.remove(value)
+                self._kv_set(name, data)
+        return True
+
+    def lremlist(self, name: str) -> int:
+        count = len(self.get(name))
+        self.rem(name)
+        return count
+
+    def dump(self) -> bool:
+        self.conn.commit()
+        return True
+
+    def close(self):
+        self.conn.close()